@@ -0,0 +1,71 @@
+# Per-row cost of the results table extraction: six CSS selectors per row
+# (extraer_datos_tabla) against the single pass over the table (extraer_tabla).
+#   python benchmarks/bench_extraction.py --repeat 50
+import os
+import sys
+import json
+import time
+import argparse
+from scrapy.http import HtmlResponse, Request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_spider import FIXTURES, SanSilvestreSpider
+
+def load_pages(path=FIXTURES):
+    pages = []
+    for name in sorted(os.listdir(path)):
+        if name.startswith('resultados_'):
+            with open(os.path.join(path, name), 'rb') as f:
+                pages.append(f.read())
+    return pages
+
+def per_row(spider, response):
+    return [(spider.extraer_datos_tabla(fila, response.meta), fila.css('td.nombre a::attr(href)').get())
+            for fila in response.css('table tbody tr')]
+
+def single_pass(spider, response):
+    return list(spider.extraer_tabla(response, response.meta))
+
+# Responses are built fresh every round so neither path reuses a parsed document
+def time_extractor(extractor, spider, pages, repeat):
+    rows, elapsed = 0, 0.0
+    for _ in range(repeat):
+        for body in pages:
+            request = Request('https://sansilvestrecoruna.com/', meta={'fecha': '2019', 'location': 'A Coruña'})
+            response = HtmlResponse(request.url, body=body, request=request, encoding='utf-8')
+            response.selector  # Parse the HTML outside the timed section
+            start = time.perf_counter()
+            rows += len(extractor(spider, response))
+            elapsed += time.perf_counter() - start
+    return rows, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Results table extraction benchmark")
+    parser.add_argument('--repeat', type=int, default=20, help="times every fixture page is extracted")
+    parser.add_argument('--json', action='store_true', help="print the results as a JSON line")
+    args = parser.parse_args()
+
+    spider = SanSilvestreSpider()
+    pages = load_pages()
+
+    # Both paths must produce the same items
+    for body in pages:
+        request = Request('https://sansilvestrecoruna.com/', meta={'fecha': '2019', 'location': 'A Coruña'})
+        response = HtmlResponse(request.url, body=body, request=request, encoding='utf-8')
+        expected = [(dict(item), url) for item, url in per_row(spider, response)]
+        assert expected == [(dict(item), url) for item, url in single_pass(spider, response)], "Extractors differ"
+
+    results = {'benchmark': 'extraction'}
+    for name, extractor in (('per_row', per_row), ('single_pass', single_pass)):
+        rows, elapsed = time_extractor(extractor, spider, pages, args.repeat)
+        results[f'{name}_us_per_row'] = round(1e6 * elapsed / rows, 2)
+    results['speedup'] = round(results['per_row_us_per_row'] / results['single_pass_us_per_row'], 1)
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for key, value in results.items():
+            print(f"{key:>24}: {value}")
+
+if __name__ == "__main__":
+    main()
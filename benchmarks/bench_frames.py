@@ -0,0 +1,80 @@
+# Memory of the dashboard results frame: the old load_data() layout (object
+# columns repeated on every row, timedelta plus float seconds and minutes) against
+# the snapshot frames the dashboard keeps in memory (queries.data). Reads the
+# database set in .env, e.g. the imported database/exported_data.sql, whose
+# import must have written the snapshot:
+#   python benchmarks/bench_frames.py
+import os
+import sys
+import json
+import time
+import argparse
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+import queries
+
+# Same query and derived columns the dashboard used to load everything with
+def load_legacy():
+    df = queries.read_sql("""
+        SELECT res.finish_time, res.age_group, r.name AS runner_name, r.gender,
+               ra.location, ra.year, ra.distance, ra.id AS race_id
+        FROM race_results res
+        JOIN runners r ON res.runner_id = r.id
+        JOIN races ra ON res.race_id = ra.id
+    """)
+    # MySQL returns TIME as timedelta, SQLite as text
+    df['finish_time'] = pd.to_timedelta(df['finish_time'])
+    df['total_seconds'] = df['finish_time'].dt.total_seconds()
+    df['minutes'] = df['total_seconds'] / 60
+    return df
+
+# What the dashboard loads at startup
+def load_compact():
+    queries.refresh_snapshot()
+    if queries.data is None:
+        sys.exit("❌ No snapshot matches the database, import the data again to write it")
+    return queries.data['results'], queries.data['races']
+
+def megabytes(frame):
+    return round(frame.memory_usage(deep=True).sum() / 2**20, 2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard results frame memory benchmark")
+    parser.add_argument('--json', action='store_true', help="print the results as a JSON line")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    legacy = load_legacy()
+    legacy_secs = time.perf_counter() - start
+    start = time.perf_counter()
+    results, races = load_compact()
+    compact_secs = time.perf_counter() - start
+
+    # Both layouts must describe the same results
+    assert len(legacy) == len(results), "Row counts differ"
+    assert legacy['total_seconds'].sum() == results['total_seconds'].sum(), "Finish times differ"
+
+    summary = {
+        'benchmark': 'frames',
+        'backend': queries.backend.name,
+        'rows': len(results),
+        'legacy_mb': megabytes(legacy),
+        'compact_mb': megabytes(results) + megabytes(races),
+        'legacy_load_secs': round(legacy_secs, 3),
+        'compact_load_secs': round(compact_secs, 3)
+    }
+    summary['reduction'] = round(summary['legacy_mb'] / summary['compact_mb'], 1)
+
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        for key, value in summary.items():
+            print(f"{key:>18}: {value}")
+        print("\nPer column (MB):")
+        for name, frame in (('legacy', legacy), ('compact', results)):
+            usage = (frame.memory_usage(deep=True, index=False) / 2**20).round(2)
+            print(f"  {name}: {usage.to_dict()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# Offline check of the HTTP cache (HttpCacheMiddleware with EdicionesCerradasPolicy).
+#
+# Replays the fixtures of bench_spider.py through the cache middleware three times,
+# with a fake server that sends ETags and answers If-None-Match with a 304:
+#   1. cold: every page is downloaded and stored
+#   2. warm: every page is served from the cache
+#   3. after HTTPCACHE_CURRENT_EDITION_TTL: past editions are still served from the
+#      cache, the current edition and the list of editions are revalidated (304)
+#   python benchmarks/bench_httpcache.py --current 2019 --ttl 1
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+from collections import Counter
+from email.utils import formatdate
+from scrapy.http import HtmlResponse, Response
+from scrapy.utils.test import get_crawler
+from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_spider import SanSilvestreSpider, crawl, find_page, load_fixtures
+
+# Fake server: fixture pages with an ETag, 304 when the request already has it.
+# Like the engine, the response that reaches the spider is tied to its request
+def server_download(routes, pages, middleware, outcomes):
+    def download(request):
+        edition = request.meta.get('fecha') or 'index'
+        cached = middleware.process_request(request)
+        if cached is not None:
+            outcomes[edition, 'cache'] += 1
+            cached.request = request
+            return cached
+
+        body = find_page(routes, pages, request.url)
+        if body is None:
+            return None
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        headers = {'Date': formatdate(usegmt=True), 'ETag': etag, 'Content-Type': 'text/html; charset=utf-8'}
+        if request.headers.get('If-None-Match', b'').decode() == etag:
+            outcomes[edition, 'revalidated'] += 1
+            response = Response(request.url, status=304, headers=headers, request=request)
+        else:
+            outcomes[edition, 'downloaded'] += 1
+            response = HtmlResponse(request.url, body=body, headers=headers, request=request, encoding='utf-8')
+        response = middleware.process_response(request, response)
+        response.request = request
+        return response
+    return download
+
+def replay(routes, pages, middleware, years):
+    outcomes = Counter()
+    start = time.perf_counter()
+    stats = crawl(routes, pages, server_download(routes, pages, middleware, outcomes), years=years)
+    return outcomes, stats['items'], round(time.perf_counter() - start, 3)
+
+# Outcome every request of an edition should have in each pass
+def expected(edition, current, replay_pass):
+    if replay_pass == 'cold':
+        return 'downloaded'
+    if replay_pass == 'warm' or edition not in (current, 'index'):
+        return 'cache'
+    return 'revalidated'
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline check of the HTTP cache policy with the spider fixtures")
+    parser.add_argument('--years', default='2018,2019', help="editions to crawl (the ones with fixtures)")
+    parser.add_argument('--current', default='2019', help="edition treated as the current one (HTTPCACHE_CURRENT_EDITION)")
+    parser.add_argument('--ttl', type=int, default=1, help="HTTPCACHE_CURRENT_EDITION_TTL in seconds, waited before the last pass")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON lines")
+    args = parser.parse_args()
+
+    routes, pages = load_fixtures()
+    failed = False
+    with tempfile.TemporaryDirectory() as folder:
+        crawler = get_crawler(SanSilvestreSpider, {
+            'HTTPCACHE_ENABLED': True,
+            'HTTPCACHE_DIR': folder,
+            'HTTPCACHE_POLICY': 'scrapy_project.httpcache.EdicionesCerradasPolicy',
+            'HTTPCACHE_CURRENT_EDITION': args.current,
+            'HTTPCACHE_CURRENT_EDITION_TTL': args.ttl
+        })
+        crawler.spider = SanSilvestreSpider.from_crawler(crawler)
+        middleware = HttpCacheMiddleware.from_crawler(crawler)
+        middleware.spider_opened(crawler.spider)
+
+        for replay_pass in ('cold', 'warm', 'after_ttl'):
+            if replay_pass == 'after_ttl':
+                time.sleep(args.ttl + 1)
+            outcomes, items, seconds = replay(routes, pages, middleware, args.years)
+            editions = sorted({edition for edition, _ in outcomes})
+            wrong = {f"{edition}/{outcome}": count for (edition, outcome), count in outcomes.items()
+                     if outcome != expected(edition, args.current, replay_pass)}
+            failed = failed or bool(wrong)
+            result = {'benchmark': 'httpcache', 'pass': replay_pass, 'items': items, 'secs': seconds,
+                      'editions': {edition: {outcome: count for (e, outcome), count in outcomes.items() if e == edition}
+                                   for edition in editions},
+                      'unexpected': wrong}
+            if args.json:
+                print(json.dumps(result))
+                continue
+            print(f"\n{replay_pass}: {items} items in {seconds}s")
+            for edition in editions:
+                print(f"{edition:>8}: {result['editions'][edition]}")
+            print(f"❌ Unexpected: {wrong}" if wrong else "✅ As expected")
+        middleware.spider_closed(crawler.spider)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# Scale benchmark: for each scale, generates a synthetic crawl (generate_data.py),
+# imports it into a fresh SQLite database and times the dashboard's start and views
+# on it, with and without the columnar snapshot. Each scale runs in its own process,
+# so the peak memory reported is the one of that scale:
+#   python benchmarks/bench_scale.py --scales 1,10 --output data/bench_scale.jsonl
+# Every run appends one JSON line per scale (with the current commit) to --output.
+import os
+import io
+import sys
+import json
+import time
+import resource
+import argparse
+import tempfile
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCHMARKS, '..')
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+def median_ms(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return round(1000 * statistics.median(timings), 2)
+
+# What a new dashboard process does before showing the first page
+def dashboard_start(queries):
+    start = time.perf_counter()
+    races = queries.load_races()
+    queries.load_filter_options()
+    index = queries.load_runner_index()
+    return races, index, round(time.perf_counter() - start, 3)
+
+def time_views(queries, race_id, runner, index, repeat):
+    genders, age_groups = queries.load_filter_options(race_id)
+    views = {
+        'race_summary': lambda: queries.load_race_summary(race_id),
+        'race_stats': lambda: queries.load_race_stats(race_id, tuple(genders), tuple(age_groups)),
+        'race_histogram': lambda: queries.load_race_histogram(race_id, tuple(genders), tuple(age_groups)),
+        'race_stats_custom_filter': lambda: queries.load_race_stats(race_id, tuple(genders[:1]), tuple(age_groups[:3])),
+        'all_races_stats': lambda: queries.load_race_stats(None, tuple(genders), tuple(age_groups)),
+        'runner_search': lambda: index.search(runner.split()[0]),
+        'runner_history': lambda: queries.load_runner_history(runner),
+        'all_races_histogram': lambda: queries.load_race_histogram(None, tuple(genders), tuple(age_groups)),
+        'race_field_histogram': lambda: queries.load_race_histogram(race_id, None, None, bins=40)
+    }
+    return {name: median_ms(view, repeat) for name, view in views.items()}
+
+# Child process: one scale, database and snapshot paths come from the environment
+def run_scale(scale, workers, repeat, seed):
+    sys.path.insert(0, os.path.join(ROOT, 'database'))
+    sys.path.insert(0, os.path.join(ROOT, 'dashboard'))
+    import generate_data
+    import import_data
+    import queries
+
+    folder = os.path.dirname(os.environ['SQLITE_PATH'])
+    data_file = os.path.join(folder, 'synthetic.jsonl')
+    result = {'benchmark': 'scale', 'scale': scale, 'workers': workers}
+
+    start = time.perf_counter()
+    result['rows'] = generate_data.write_dataset(data_file, scale, seed)
+    result['editions'] = len(generate_data.editions_for(scale)[0])
+    result['generate_secs'] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        import_data.import_data(data_file, bulk=True, workers=workers)
+    elapsed = time.perf_counter() - start
+    result['import_secs'] = round(elapsed, 3)
+    result['import_rows_per_sec'] = round(result['rows'] / elapsed)
+    result['db_mb'] = round(os.path.getsize(os.environ['SQLITE_PATH']) / 2**20, 1)
+    result['peak_rss_mb'] = {'import': peak_rss_mb()}
+
+    # Database first: no snapshot has been loaded yet
+    result['start_secs'] = {'sql': dashboard_start(queries)[2]}
+    start = time.perf_counter()
+    queries.refresh_snapshot()
+    loaded = time.perf_counter() - start
+    race_options, index, seconds = dashboard_start(queries)
+    result['start_secs']['snapshot'] = round(loaded + seconds, 3) if queries.data is not None else None
+
+    race_id = int(race_options['race_id'].iloc[0])
+    # A runner that exists at every scale, searched by the first word of the name
+    runner = index.names[len(index) // 2]
+    result['views_ms'] = {}
+    if queries.data is not None:
+        result['views_ms']['snapshot'] = time_views(queries, race_id, runner, index, repeat)
+    snapshot, queries.data = queries.data, None
+    result['views_ms']['sql'] = time_views(queries, race_id, runner, index, repeat)
+    queries.data = snapshot
+
+    result['peak_rss_mb']['total'] = peak_rss_mb()
+    if workers > 1:
+        result['peak_rss_mb']['workers'] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    return result
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Import and dashboard benchmark at growing data volumes")
+    parser.add_argument('--scales', default='1,10', help="comma separated sizes relative to the exported data")
+    parser.add_argument('--workers', type=int, default=1, help="importer processes (import_data.py --workers)")
+    parser.add_argument('--repeat', type=int, default=5, help="times each dashboard view is timed (median)")
+    parser.add_argument('--seed', type=int, default=42, help="generator seed")
+    parser.add_argument('--output', help="JSON Lines file the results are appended to")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON lines")
+    parser.add_argument('--run-scale', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scale is not None:
+        print(json.dumps(run_scale(args.run_scale, args.workers, args.repeat, args.seed)))
+        return
+
+    commit = current_commit()
+    for scale in [float(s) for s in args.scales.split(',')]:
+        with tempfile.TemporaryDirectory() as folder:
+            # The importer's relative paths (failure report) stay inside the folder
+            os.makedirs(os.path.join(folder, 'run'))
+            env = dict(os.environ, DB_BACKEND='sqlite', SQLITE_PATH=os.path.join(folder, 'bench.db'),
+                       SNAPSHOT_DIR=os.path.join(folder, 'snapshot'), DB_LOG_LEVEL='ERROR', METRICS_FILE='')
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-scale', str(scale),
+                                     '--workers', str(args.workers), '--repeat', str(args.repeat), '--seed', str(args.seed)],
+                                    cwd=os.path.join(folder, 'run'), env=env, capture_output=True, text=True)
+        if output.returncode != 0:
+            print(f"❌ Scale {scale:g} failed:\n{output.stderr}")
+            continue
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        result['commit'] = commit
+
+        if args.output:
+            os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+            with open(args.output, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(result) + '\n')
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"\nScale {scale:g}x: {result['rows']} results in {result['editions']} editions")
+            for key, value in result.items():
+                if key not in ('benchmark', 'scale', 'rows', 'editions'):
+                    print(f"{key:>20}: {value}")
+
+if __name__ == "__main__":
+    main()
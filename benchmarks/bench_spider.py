@@ -0,0 +1,117 @@
+# Offline benchmark for SanSilvestreSpider.
+#
+# Replays the pages in fixtures/ through the spider callbacks with fake responses
+# (no network, no reactor) and reports parsing throughput. The fixtures are not
+# captures of the site, which could not be reached when they were made: they are
+# hand-written pages that follow its markup (the selectors the spider uses), with
+# made-up results. CPU per page is only comparable between runs over these pages,
+# not with the real ones:
+#   python benchmarks/bench_spider.py --repeat 20
+import os
+import sys
+import json
+import time
+import fnmatch
+import argparse
+from collections import deque
+from scrapy.http import HtmlResponse, Request
+from twisted.python.failure import Failure
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+sys.path.insert(0, ROOT)
+from scrapy_project.spiders.san_silvestre import SanSilvestreSpider
+
+def load_fixtures(path=FIXTURES):
+    with open(os.path.join(path, 'urls.json'), encoding='utf-8') as f:
+        routes = json.load(f)
+    pages = {}
+    for name in set(routes.values()):
+        with open(os.path.join(path, name), 'rb') as f:
+            pages[name] = f.read()
+    return routes, pages
+
+def find_page(routes, pages, url):
+    name = routes.get(url)
+    if name is None:
+        name = next((name for pattern, name in routes.items() if fnmatch.fnmatchcase(url, pattern)), None)
+    return pages.get(name)
+
+# Downloader that answers every request with its fixture, or None if there is none
+def fixture_download(routes, pages):
+    def download(request):
+        body = find_page(routes, pages, request.url)
+        if body is None:
+            return None
+        return HtmlResponse(request.url, body=body, request=request, encoding='utf-8')
+    return download
+
+# Runs one crawl: a FIFO of requests stands in for the scheduler and 'download' (the
+# fixtures by default) for the downloader
+def crawl(routes, pages, download=None, **spider_args):
+    download = download or fixture_download(routes, pages)
+    spider = SanSilvestreSpider(**spider_args)
+    queue = deque(Request(url, callback=spider.parse) for url in spider.start_urls)
+    seen = set()
+    stats = {'requests': 0, 'missing': 0, 'items': 0, 'pages': 0, 'cpu': 0.0}
+
+    while queue:
+        request = queue.popleft()
+        if not request.dont_filter:
+            if request.url in seen:
+                continue
+            seen.add(request.url)
+        stats['requests'] += 1
+
+        response = download(request)
+        start = time.process_time()
+        if response is None:
+            stats['missing'] += 1
+            if not request.errback:
+                continue
+            failure = Failure(Exception(f"No fixture for {request.url}"))
+            failure.request = request
+            output = request.errback(failure)
+        else:
+            output = (request.callback or spider.parse)(response)
+            stats['pages'] += 1
+        for result in output or []:
+            if isinstance(result, Request):
+                queue.append(result)
+            else:
+                stats['items'] += 1
+        stats['cpu'] += time.process_time() - start
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline parsing benchmark for the san_silvestre spider")
+    parser.add_argument('--repeat', type=int, default=10, help="number of crawls to time")
+    parser.add_argument('--years', default='2018,2019', help="editions to crawl (the ones with fixtures)")
+    parser.add_argument('--json', action='store_true', help="print the results as a JSON line")
+    args = parser.parse_args()
+
+    routes, pages = load_fixtures()
+    totals = {'requests': 0, 'missing': 0, 'items': 0, 'pages': 0, 'cpu': 0.0}
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for key, value in crawl(routes, pages, years=args.years).items():
+            totals[key] += value
+    elapsed = time.perf_counter() - start
+
+    results = {
+        'benchmark': 'spider',
+        'items': totals['items'] // args.repeat,
+        'requests': totals['requests'] // args.repeat,
+        'items_per_sec': round(totals['items'] / elapsed, 1),
+        'requests_per_item': round(totals['requests'] / max(totals['items'], 1), 4),
+        'cpu_ms_per_page': round(1000 * totals['cpu'] / max(totals['pages'], 1), 3),
+        'missing_fixtures': totals['missing'] // args.repeat
+    }
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for key, value in results.items():
+            print(f"{key:>18}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# Synthetic crawl output (RunnerItem entries) at any scale, for benchmarks.
+#
+# Scale 1 is about the size of the exported data (6 editions, ~25,000 results);
+# higher scales add editions of more locations and bigger fields. Runners come
+# back year after year, age groups and genders follow the real proportions and
+# finish times follow a log-normal pace per gender and age group:
+#   python benchmarks/generate_data.py --scale 10 --output data/synthetic_10x.jsonl
+import os
+import json
+import math
+import random
+import argparse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BASE_EDITIONS = 6
+BASE_PARTICIPANTS = 4200
+
+# Distance in metres as a float, like the spider's RunnerItem
+LOCATIONS = [('A Coruña', 7250.0), ('Lugo', 6100.0), ('Vigo', 10000.0), ('Ourense', 6000.0),
+             ('Santiago de Compostela', 7500.0), ('Ferrol', 5000.0), ('Pontevedra', 8000.0)]
+YEARS = [year for year in range(2025, 1999, -1) if year != 2020]
+
+FIRST_NAMES = {
+    'M': ['JOSE', 'ANTONIO', 'MANUEL', 'FRANCISCO', 'DAVID', 'JUAN', 'JAVIER', 'DANIEL', 'CARLOS', 'JESUS',
+          'ALEJANDRO', 'MIGUEL', 'RAFAEL', 'PABLO', 'PEDRO', 'ANGEL', 'SERGIO', 'FERNANDO', 'JORGE', 'LUIS',
+          'ALBERTO', 'ALVARO', 'ADRIAN', 'DIEGO', 'RAUL', 'IVAN', 'RUBEN', 'OSCAR', 'ANDRES', 'RAMON',
+          'ENRIQUE', 'VICTOR', 'SANTIAGO', 'IGNACIO', 'ROBERTO', 'XOAN', 'BRAIS', 'ROI', 'IAGO', 'XABIER'],
+    'F': ['MARIA', 'CARMEN', 'ANA', 'ISABEL', 'LAURA', 'CRISTINA', 'MARTA', 'LUCIA', 'PAULA', 'ELENA',
+          'SARA', 'RAQUEL', 'PATRICIA', 'BEATRIZ', 'ROCIO', 'SILVIA', 'NURIA', 'ANDREA', 'IRENE', 'ALBA',
+          'CLAUDIA', 'NATALIA', 'SONIA', 'EVA', 'NEREA', 'SANDRA', 'MONICA', 'NOELIA', 'ALICIA', 'ROSA',
+          'INES', 'UXIA', 'ANXELA', 'NOA', 'IRIA', 'SABELA', 'ANTIA', 'BEGOÑA', 'ROSALIA', 'OLALLA']
+}
+# Optional second given name, used once the single-name combinations run out
+MIDDLE_NAMES = {
+    'M': ['', 'LUIS', 'MARIA', 'CARLOS', 'MANUEL', 'ANTONIO', 'JAVIER', 'IGNACIO', 'RAMON', 'ANDRES'],
+    'F': ['', 'JOSE', 'ISABEL', 'LUISA', 'TERESA', 'PILAR', 'CARMEN', 'ELENA', 'BELEN', 'VICTORIA']
+}
+SURNAMES = ['GARCIA', 'FERNANDEZ', 'GONZALEZ', 'RODRIGUEZ', 'LOPEZ', 'MARTINEZ', 'SANCHEZ', 'PEREZ', 'GOMEZ', 'MARTIN',
+            'JIMENEZ', 'RUIZ', 'HERNANDEZ', 'DIAZ', 'MORENO', 'MUÑOZ', 'ALVAREZ', 'ROMERO', 'ALONSO', 'GUTIERREZ',
+            'NAVARRO', 'TORRES', 'DOMINGUEZ', 'VAZQUEZ', 'RAMOS', 'GIL', 'RAMIREZ', 'SERRANO', 'BLANCO', 'CASTRO',
+            'OTERO', 'REY', 'VARELA', 'BARREIRO', 'CASTIÑEIRA', 'LEMA', 'PATIÑO', 'SOUTO', 'CARBALLO', 'PARDO',
+            'IGLESIAS', 'SUAREZ', 'NUÑEZ', 'PRIETO', 'CAMPOS', 'VIDAL', 'CALVO', 'MENDEZ', 'CRUZ', 'FUENTES',
+            'ABELEDO', 'BARROS', 'CORRAL', 'TREUS', 'SEOANE', 'LOUREIRO', 'FRAGA', 'RIVAS', 'BOUZA', 'PAZOS',
+            'FIGUEROA', 'MOSQUERA', 'CASAL', 'BREA', 'FREIRE', 'CANCELA', 'VILA', 'GESTO', 'SOTO', 'CARRO',
+            'REGUEIRO', 'VILLAR', 'TOURIÑO', 'QUINTELA', 'NOVO', 'MOURE', 'PENA', 'LAGO', 'ARES', 'VEIGA',
+            'CABANAS', 'CALO', 'GRAÑA', 'MIRAS', 'NEIRA', 'FARIÑA', 'CEBREIRO', 'DORREGO', 'ESPIÑEIRA', 'FOLGAR',
+            'GAYOSO', 'LAMAS', 'MAROÑO', 'NOYA', 'OUTEIRO', 'PORTO', 'QUIROGA', 'RIOBO', 'SEIJAS', 'TABOADA']
+
+# (prefix, weight, pace factor) per age group, weights from the exported data
+AGE_GROUPS = [('SN', 24, 0.97), ('VTA', 21, 1.0), ('VTB', 19, 1.03), ('VTC', 7, 1.08), ('VTD', 2, 1.15),
+              ('JV1', 7, 1.05), ('JV2', 5, 1.0)]
+GENDER_WEIGHTS = {'M': 59, 'F': 41}
+# Median pace in min/km and spread of its logarithm
+PACE = {'M': 5.9, 'F': 6.6}
+PACE_SIGMA = 0.17
+# Results without a time (walkers, DNF recorded as entries)
+MISSING_TIME = 0.002
+
+# Unique name for runner 'index': its digits pick the first name, two surnames and
+# the second given name, so two indexes never give the same name
+def runner_name(index, gender):
+    first = FIRST_NAMES[gender][index % 40]
+    index //= 40
+    surname1, surname2 = SURNAMES[index % 100], SURNAMES[(index // 100) % 100]
+    middle = MIDDLE_NAMES[gender][(index // 10000) % 10]
+    return ' '.join(part for part in (first, middle, surname1, surname2) if part)
+
+def format_time(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+def editions_for(scale):
+    count = max(1, math.ceil(BASE_EDITIONS * math.sqrt(scale)))
+    # Like the real data: every edition of a location before moving to the next one
+    editions = [(location, distance, year) for location, distance in LOCATIONS for year in YEARS][:count]
+    if len(editions) < count:
+        raise ValueError(f"Scale {scale} needs {count} editions, there are only {len(editions)}")
+    return editions, round(BASE_EDITIONS * BASE_PARTICIPANTS * scale / count)
+
+# Yields the entries edition by edition, nothing but the runner pool is kept in memory
+def generate(scale=1, seed=42):
+    rng = random.Random(seed)
+    editions, participants = editions_for(scale)
+    # Runners that could take part, a fraction of them come back every year
+    pool_size = max(participants, int(len(editions) * participants * 0.6))
+    genders = rng.choices(list(GENDER_WEIGHTS), weights=list(GENDER_WEIGHTS.values()), k=pool_size)
+    ability = [rng.lognormvariate(0, PACE_SIGMA) for _ in range(pool_size)]
+    prefixes, weights, factors = zip(*AGE_GROUPS)
+
+    for location, distance, year in editions:
+        km = distance / 1000
+        field = set()
+        while len(field) < participants:
+            # Low indexes are the regulars
+            field.add(int(pool_size * rng.random() ** 1.6))
+        for index in field:
+            gender = genders[index]
+            group = rng.choices(range(len(prefixes)), weights=weights)[0]
+            seconds = None
+            if rng.random() > MISSING_TIME:
+                pace = max(2.9, PACE[gender] * factors[group] * ability[index] * rng.lognormvariate(0, 0.05))
+                seconds = pace * km * 60
+            yield {
+                'runner_name': runner_name(index, gender),
+                'finish_time': format_time(seconds) if seconds else None,
+                'age_group': f"{prefixes[group]}{gender}",
+                'gender': gender,
+                'race_distance': distance,
+                'race_date': str(year),
+                'location': location
+            }
+
+# Writes JSON Lines, or a JSON array like 'scrapy crawl -o file.json' for any other extension
+def write_dataset(path, scale=1, seed=42):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    count = 0
+    array = not path.endswith(('.jsonl', '.jl'))
+    with open(path, 'w', encoding='utf-8') as f:
+        if array:
+            f.write('[\n')
+        for item in generate(scale, seed):
+            line = json.dumps(item, ensure_ascii=False)
+            f.write((',\n' if array and count else '') + line + ('' if array else '\n'))
+            count += 1
+        if array:
+            f.write('\n]\n')
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic crawl output for benchmarks")
+    parser.add_argument('--scale', type=float, default=1, help="size relative to the exported data (~25,000 results)")
+    parser.add_argument('--seed', type=int, default=42, help="random seed, the same seed gives the same file")
+    parser.add_argument('--output', help="output .jsonl or .json file (default data/synthetic_<scale>x.jsonl)")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(ROOT, 'data', f"synthetic_{args.scale:g}x.jsonl")
+    editions, participants = editions_for(args.scale)
+    count = write_dataset(output, args.scale, args.seed)
+    print(f"✅ {count} entries ({len(editions)} editions of ~{participants} runners) written to '{output}'")
+
+if __name__ == "__main__":
+    main()
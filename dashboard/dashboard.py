@@ -1,49 +1,34 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import mysql.connector
-import re
-import os
-from dotenv import load_dotenv
+import queries
+# Shared with the spider and the importer, it lives in /database/ next to the storage layer
+import metrics
 
-load_dotenv()
 st.set_page_config(page_title="Race Analytics Dashboard", layout="wide")
 
-# DB Config
-DB_CONFIG={
-    'host': os.getenv('DB_HOST'),
-    'user': os.getenv('DB_USER'),
-    'password': os.getenv('DB_PASSWORD'),
-    'database': os.getenv('DB_NAME')
-}
-@st.cache_data
-def load_data():
-    conn = mysql.connector.connect(**DB_CONFIG)
-    
-    # Unify 3 tables in one dataframe
-    query = """
-    SELECT 
-        res.finish_time, 
-        res.age_group, 
-        r.name as runner_name, 
-        r.gender, 
-        ra.location, 
-        ra.year, 
-        ra.distance,
-        ra.id as race_id
-    FROM race_results res
-    JOIN runners r ON res.runner_id = r.id
-    JOIN races ra ON res.race_id = ra.id
-    """
-    df = pd.read_sql(query, conn)
-    conn.close()
-    
-    # Data cleansing and conversing
-    df['total_seconds'] = df['finish_time'].dt.total_seconds()
-    # Create "minutes" column for graphics
-    df['minutes'] = df['total_seconds'] / 60
-    
-    return df
+# Each view only loads what it shows, cached per set of arguments
+load_races = st.cache_data(queries.load_races)
+load_filter_options = st.cache_data(queries.load_filter_options)
+load_race_stats = st.cache_data(queries.load_race_stats)
+load_race_histogram = st.cache_data(queries.load_race_histogram)
+load_race_summary = st.cache_data(queries.load_race_summary)
+load_runner_index = st.cache_resource(queries.load_runner_index)
+load_runner_history = st.cache_data(queries.load_runner_history)
+
+# Bars drawn from pre-computed bins (seconds), the page only gets edges and counts
+def histogram_chart(bins, title, color, **bar_options):
+    fig = px.bar(
+        x=(bins['bin_start'] + bins['bin_end']) / 120,
+        y=bins['finishers'],
+        title=title,
+        labels={"x": "Minutes", "y": "count"},
+        color_discrete_sequence=[color],
+        **bar_options
+    )
+    fig.update_traces(width=(bins['bin_end'] - bins['bin_start']) / 60)
+    fig.update_layout(bargap=0)
+    return fig
 
 # Format time to format HH:MM:SS
 def format_time(seconds):
@@ -52,74 +37,85 @@ def format_time(seconds):
     h, m = divmod(m, 60)
     return f"{int(h):02d}:{int(m):02d}:{int(s):02d}"
 
-# Extract numeric distance
-def extract_distance(dist_str):
-    try:
-        # Busca números (puede tener decimales)
-        match = re.search(r"(\d+(\.\d+)?)", str(dist_str))
-        return float(match.group(1)) if match else None
-    except:
-        return None
-
+# Load, filter and render time of each view, written to the metrics file after every run
+timing = metrics.Phases('dashboard_view', view="Startup")
+timing('load')
 try:
-    df_all = load_data()
+    # Memory-maps the snapshot written by the importer, a newer import drops the cached views
+    if queries.refresh_snapshot():
+        st.cache_data.clear()
+        load_runner_index.clear()
+    race_options = load_races()
 except Exception as e:
     st.error(f"❌ Connection to database failed: {e}")
     st.stop()
+timing.stop()
 
 
 st.sidebar.title("🏃 Race Analytics")
 view_mode = st.sidebar.radio("Select view:", ["Race Analysis", "Runner Analysis"])
+timing = metrics.Phases('dashboard_view', view=view_mode)
+timing('render')
 
 if view_mode == "Race Analysis":
     st.title("📊 Race Analysis")
 
-    race_options = df_all[['location', 'year', 'race_id']].drop_duplicates()
-    race_options['label'] = race_options['location'] + " (" + race_options['year'].astype(str) + ")"
-    
-    list_of_races = sorted(race_options['label'].unique().tolist())
+    list_of_races = race_options['label'].unique().tolist()
     dropdown_options = ["All Races"] + list_of_races
     selected_option = st.selectbox("Select edition:", options=dropdown_options)
     
     if selected_option == "All Races":
-        df_race = df_all.copy()
+        selected_race_id = None
         chart_title = "Time distribution (All Races)"
     else:
-        selected_race_id = race_options[race_options['label'] == selected_option]['race_id'].values[0]
-        df_race = df_all[df_all['race_id'] == selected_race_id].copy()
+        selected_race_id = int(race_options[race_options['label'] == selected_option]['race_id'].values[0])
         chart_title = f"Time distribution ({selected_option})"
 
+    timing('load')
+    gender_options, age_options = load_filter_options(selected_race_id)
+    timing('render')
     col1, col2 = st.columns(2)
     with col1:
-        gender_options = sorted(df_race['gender'].unique().astype(str))
         gender_filter = st.multiselect("Filter by gender:", options=gender_options, default=gender_options)
     with col2:
-        age_options = sorted(df_race['age_group'].unique().astype(str))
         age_filter = st.multiselect("Filter by age group:", options=age_options, default=age_options)
 
-    df_filtered = df_race[
-        (df_race['gender'].isin(gender_filter)) & 
-        (df_race['age_group'].isin(age_filter))
-    ]
+    # Single races with the default filters (or one gender / age group) read the
+    # aggregates stored at import time, other combinations go to the results
+    timing('filter')
+    summary, bins = None, None
+    group = queries.summary_group(gender_filter, age_filter, gender_options, age_options)
+    if selected_race_id is not None and group:
+        timing('load')
+        race_summary, race_bins = load_race_summary(selected_race_id)
+        timing('filter')
+        gender, age_group = group
+        summary = race_summary[(race_summary['gender'] == gender) & (race_summary['age_group'] == age_group)]
+        bins = race_bins[(race_bins['gender'] == gender) & (race_bins['age_group'] == age_group)]
+
+    if summary is not None and len(summary) > 0:
+        stats = summary.iloc[0].to_dict()
+    else:
+        summary = None
+        timing('load')
+        stats = load_race_stats(selected_race_id, tuple(gender_filter), tuple(age_filter))
 
+    timing('render')
     st.markdown("---")
 
-    if not df_filtered.empty:
+    if stats['participants'] > 0:
         c1, c2, c3, c4 = st.columns(4)
-        c1.metric("Participants", len(df_filtered))
-        c2.metric("Record time", format_time(df_filtered['total_seconds'].min()))
-        c3.metric("Average", format_time(df_filtered['total_seconds'].mean()))
-        c4.metric("Worst time", format_time(df_filtered['total_seconds'].max()))
+        c1.metric("Participants", int(stats['participants']))
+        c2.metric("Record time", format_time(stats['best']))
+        c3.metric("Average", format_time(stats['average']))
+        c4.metric("Worst time", format_time(stats['worst']))
 
         st.subheader("Time distribution")
-        fig = px.histogram(
-            df_filtered, 
-            x="minutes", 
-            nbins=30, 
-            title="How many people finished in X minutes?",
-            labels={"minutes": "Minutes"},
-            color_discrete_sequence=["#ff4b4b"]
-        )
+        if summary is None:
+            timing('load')
+            bins = load_race_histogram(selected_race_id, tuple(gender_filter), tuple(age_filter))
+            timing('render')
+        fig = histogram_chart(bins, "How many people finished in X minutes?", "#ff4b4b")
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.warning("No data found for selected filters.")
@@ -131,8 +127,11 @@ elif view_mode == "Runner Analysis":
     selected_runner = None
 
     if search_query:
-        mask = df_all['runner_name'].str.upper().str.startswith(search_query.upper())
-        filtered_runners = sorted(df_all[mask]['runner_name'].unique())[:10]
+        timing('load')
+        index = load_runner_index()
+        timing('filter')
+        filtered_runners = index.search(search_query)
+        timing('render')
 
         if len(filtered_runners) > 0:
             selected_runner = st.selectbox(
@@ -148,42 +147,30 @@ elif view_mode == "Runner Analysis":
     if selected_runner:
         st.divider()
 
-        runner_history = df_all[df_all['runner_name'] == selected_runner].copy()
+        timing('load')
+        runner_history = load_runner_history(selected_runner)
+        timing('filter')
 
         st.subheader(f"{selected_runner.split(' ')[0]}'s history")
         
-        history_data = []
-        
-        for index, row in runner_history.iterrows():
-            race_participants = df_all[df_all['race_id'] == row['race_id']]
-            
-            race_participants = race_participants.sort_values('total_seconds').reset_index(drop=True)
-            try:
-                position = race_participants[race_participants['runner_name'] == selected_runner].index[0] + 1
-            except:
-                position = -1
-            
-            total_runners = len(race_participants)
-            
-            dist_km = extract_distance(row['distance'])
-            if dist_km and dist_km > 0:
-                pace_min_km = row['minutes'] / dist_km
-                pace_str = f"{pace_min_km:.2f} min/km"
-            else:
-                pace_str = "N/A"
-
-            history_data.append({
-                "Edition": f"{row['location']} ({row['year']})",
-                "Time": format_time(row['total_seconds']),
-                "Position": f"{position} / {total_runners}",
-                "Pace": pace_str,
-                "race_id": row['race_id'],
-                "my_time_min": row['minutes']
-            })
-
-        df_display = pd.DataFrame(history_data)
+        # Positions, field sizes and percentiles are stored at import time
+        distances = race_options.set_index('race_id')['distance_km']
+        df_display = pd.DataFrame({
+            "Edition": runner_history['location'] + " (" + runner_history['year'].astype(str) + ")",
+            "Time": runner_history['total_seconds'].map(format_time),
+            "Position": [f"{int(p)} / {int(n)}" if pd.notna(p) else f"N/A / {int(n)}"
+                         for p, n in zip(runner_history['position'], runner_history['participants'])],
+            "Percentile": runner_history['percentile'].map(lambda p: f"{p:.1f}" if pd.notna(p) else "N/A"),
+            "Pace": [f"{minutes / dist_km:.2f} min/km" if dist_km and dist_km > 0 else "N/A"
+                     for minutes, dist_km in zip(runner_history['minutes'], runner_history['race_id'].map(distances))],
+            "race_id": runner_history['race_id'],
+            "my_time_min": runner_history['minutes']
+        })
+        history_data = df_display.to_dict('records')
+
+        timing('render')
         st.dataframe(
-            df_display[['Edition', 'Time', 'Position', 'Pace']], 
+            df_display[['Edition', 'Time', 'Position', 'Percentile', 'Pace']], 
             use_container_width=True,
             hide_index=True
         )
@@ -199,16 +186,16 @@ elif view_mode == "Runner Analysis":
 
         if selected_race_comp:
             race_id_comp = selected_race_comp['race_id']
-            race_data = df_all[df_all['race_id'] == race_id_comp]
+            timing('load')
+            race_bins = load_race_histogram(race_id_comp, None, None, bins=40)
+            timing('render')
             
             my_time = selected_race_comp['my_time_min']
 
-            fig2 = px.histogram(
-                race_data, 
-                x="minutes", 
-                nbins=40, 
-                title=f"Position in '{selected_race_comp['Edition']}'",
-                color_discrete_sequence=['lightgray'], 
+            fig2 = histogram_chart(
+                race_bins,
+                f"Position in '{selected_race_comp['Edition']}'",
+                'lightgray',
                 opacity=0.6
             )
 
@@ -221,4 +208,7 @@ elif view_mode == "Runner Analysis":
                 margin=dict(t=50, l=0, r=0, b=0)
             )
 
-            st.plotly_chart(fig2, use_container_width=True)
\ No newline at end of file
+            st.plotly_chart(fig2, use_container_width=True)
+
+timing.stop()
+metrics.flush('dashboard')
@@ -0,0 +1,244 @@
+import os
+import re
+import sys
+import time
+from bisect import bisect_left
+import numpy as np
+import pandas as pd
+
+# Shared storage layer lives next to the importer
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database'))
+from storage import get_backend, name_key, ALL
+from connection import connect_with_retry, log_query
+import snapshot
+
+# Query layer for the dashboard: every view asks only for the rows or aggregates it shows,
+# so startup time and memory don't grow with the number of editions in the database.
+# These are plain functions, dashboard.py wraps them with st.cache_data.
+# When the importer's columnar snapshot matches the database, they read the
+# memory-mapped snapshot instead and only the import manifest is queried.
+
+backend = get_backend()
+# Seconds between checks of the import manifest for a newer snapshot
+SNAPSHOT_CHECK_SECS=30
+
+# Numeric part and unit of the 'distance' column ("7250 m", "10 km", or "6750.0" in
+# metres as the spider stores it)
+DISTANCE_PATTERN = re.compile(r"(\d+(?:[.,]\d+)?)\s*(km|m)?", re.IGNORECASE)
+
+# Snapshot in use ({'races', 'results'} frames) or None to query the database
+data = None
+version = None
+checked_at = None
+
+# Loads the snapshot at startup and again after each import. Returns True when the
+# database changed since the last check, so the caller can drop its cached views
+def refresh_snapshot():
+    global data, version, checked_at
+    if checked_at is not None and time.monotonic() - checked_at < SNAPSHOT_CHECK_SECS:
+        return False
+    checked_at = time.monotonic()
+    conn = connect_with_retry(backend)
+    try:
+        cursor = backend.cursor(conn)
+        current = snapshot.manifest_version(cursor)
+        cursor.close()
+    finally:
+        conn.close()
+    # The importer commits the manifest before it writes the snapshot: until it
+    # shows up, the database is queried and the next checks try to load it again
+    if current == version and data is not None:
+        return False
+
+    changed = version is not None and current != version
+    version = current
+    data = None
+    tables = snapshot.read_snapshot(current)
+    if tables is not None:
+        results = tables['results'].to_pandas()
+        for column in ('total_seconds', 'position'):
+            results[column] = results[column].astype('Int32')
+        data = {'races': tables['races'].to_pandas(), 'results': results}
+    return changed
+
+# Pooled connection per query, timed like the importer's
+def read_sql(query, params=()):
+    conn = connect_with_retry(backend)
+    try:
+        start = time.perf_counter()
+        frame = pd.read_sql(backend.sql(query), conn, params=list(params))
+        log_query(query, time.perf_counter() - start, len(frame))
+        return frame
+    finally:
+        conn.close()
+
+# WHERE clause for the Race Analysis filters ('race_id' None means all races)
+def results_filter(race_id, genders, age_groups):
+    conditions, params = [], []
+    if race_id is not None:
+        conditions.append("res.race_id = %s")
+        params.append(int(race_id))
+    for column, values in (("r.gender", genders), ("res.age_group", age_groups)):
+        if values is None:
+            continue
+        if not values:
+            conditions.append("1 = 0")
+            continue
+        conditions.append(f"{column} IN ({', '.join(['%s'] * len(values))})")
+        params.extend(values)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+# Same filter over the snapshot results
+def snapshot_results(race_id, genders=None, age_groups=None):
+    results = data['results']
+    mask = pd.Series(True, index=results.index)
+    if race_id is not None:
+        mask &= results['race_id'] == int(race_id)
+    for column, values in (('gender', genders), ('age_group', age_groups)):
+        if values is not None:
+            mask &= results[column].isin(values)
+    return results[mask]
+
+# Same dtypes for a runner's history from the snapshot or from the database:
+# ids and times as 32-bit integers (nullable where the column can be NULL)
+HISTORY_DTYPES = {'race_id': 'int32', 'total_seconds': 'Int32', 'position': 'Int32', 'percentile': 'float32',
+                  'year': 'int32', 'participants': 'Int32'}
+
+# Distance in kilometres, parsed once per race instead of once per result
+def distance_km(distance):
+    match = DISTANCE_PATTERN.search(str(distance or ''))
+    if not match:
+        return None
+    value = float(match.group(1).replace(',', '.'))
+    # Without a unit it is metres, the spider's unit
+    return value if (match.group(2) or '').lower() == 'km' else value / 1000
+
+def load_races():
+    if data is not None:
+        races = data['races'][['race_id', 'location', 'year', 'distance']].copy()
+    else:
+        races = read_sql("SELECT id AS race_id, location, year, distance FROM races")
+    races['label'] = races['location'] + " (" + races['year'].astype(str) + ")"
+    races['distance_km'] = races['distance'].map(distance_km).astype('float32')
+    return races.sort_values('label').reset_index(drop=True)
+
+def load_filter_options(race_id=None):
+    if data is not None:
+        options = snapshot_results(race_id)
+    else:
+        where, params = results_filter(race_id, None, None)
+        options = read_sql(f"""
+            SELECT DISTINCT r.gender, res.age_group
+            FROM race_results res
+            JOIN runners r ON res.runner_id = r.id
+            {where}
+        """, params)
+    genders = sorted(options['gender'].dropna().astype(str).unique())
+    age_groups = sorted(options['age_group'].dropna().astype(str).unique())
+    return genders, age_groups
+
+# Participants, record, average and worst time in seconds
+def load_race_stats(race_id, genders, age_groups):
+    if data is not None:
+        seconds = snapshot_results(race_id, genders, age_groups)['total_seconds']
+        return {'participants': len(seconds), 'best': seconds.min(), 'average': seconds.mean(), 'worst': seconds.max()}
+    where, params = results_filter(race_id, genders, age_groups)
+    stats = read_sql(f"""
+        SELECT
+            COUNT(*) AS participants,
+            MIN(TIME_TO_SEC(res.finish_time)) AS best,
+            AVG(TIME_TO_SEC(res.finish_time)) AS average,
+            MAX(TIME_TO_SEC(res.finish_time)) AS worst
+        FROM race_results res
+        JOIN runners r ON res.runner_id = r.id
+        {where}
+    """, params)
+    return stats.iloc[0].to_dict()
+
+# Equal width bins (in seconds) of the filtered finish times, like the ones stored in
+# race_histogram. Only the bins leave this function, whatever the size of the field:
+# the database returns one row per distinct time and numpy bins them
+def load_race_histogram(race_id, genders, age_groups, bins=30):
+    weights = None
+    if data is not None:
+        seconds = snapshot_results(race_id, genders, age_groups)['total_seconds'].dropna().to_numpy(dtype='float64')
+    else:
+        where, params = results_filter(race_id, genders, age_groups)
+        counts = read_sql(f"""
+            SELECT TIME_TO_SEC(res.finish_time) AS seconds, COUNT(*) AS finishers
+            FROM race_results res
+            JOIN runners r ON res.runner_id = r.id
+            {where}
+            GROUP BY TIME_TO_SEC(res.finish_time)
+        """, params).dropna()
+        seconds, weights = counts['seconds'].to_numpy(dtype='float64'), counts['finishers'].to_numpy()
+    if len(seconds) == 0:
+        return pd.DataFrame({'bin_start': [], 'bin_end': [], 'finishers': []})
+    finishers, edges = np.histogram(seconds, bins=bins, weights=weights)
+    return pd.DataFrame({'bin_start': edges[:-1], 'bin_end': edges[1:], 'finishers': finishers.astype('int64')})
+
+# Summary rows and histogram bins the importer keeps for one race
+def load_race_summary(race_id):
+    summary = read_sql("SELECT * FROM race_summary WHERE race_id = %s", (int(race_id),))
+    bins = read_sql("""
+        SELECT gender, age_group, bin_start, bin_end, finishers
+        FROM race_histogram
+        WHERE race_id = %s
+        ORDER BY bin_index
+    """, (int(race_id),))
+    return summary, bins
+
+# Summary row answering a filter: everything, one gender or one age group.
+# Other combinations return None and are computed from the results
+def summary_group(genders, age_groups, gender_options, age_options):
+    all_genders = set(genders) == set(gender_options)
+    all_ages = set(age_groups) == set(age_options)
+    if all_genders and all_ages:
+        return ALL, ALL
+    if all_ages and len(genders) == 1:
+        return genders[0], ALL
+    if all_genders and len(age_groups) == 1:
+        return ALL, age_groups[0]
+    return None
+
+# Sorted unique runner names folded like the database collation, so a prefix search
+# is a binary search and "NUNEZ" also finds "NUÑEZ"
+class RunnerIndex:
+    def __init__(self, names):
+        entries = sorted((name_key(name), name) for name in set(names))
+        self.keys = [key for key, _ in entries]
+        self.names = [name for _, name in entries]
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, prefix, limit=10):
+        key = name_key(prefix)
+        start = bisect_left(self.keys, key)
+        end = bisect_left(self.keys, key + '\U0010ffff', lo=start)
+        return self.names[start:min(end, start + limit)]
+
+def load_runner_index():
+    if data is not None:
+        return RunnerIndex(data['results']['runner_name'].cat.categories)
+    return RunnerIndex(read_sql("SELECT name FROM runners")['name'])
+
+def load_runner_history(runner_name):
+    if data is not None:
+        results = data['results']
+        history = results.loc[results['runner_name'] == runner_name, ['race_id', 'total_seconds', 'position', 'percentile']]
+        history = history.merge(data['races'], on='race_id').sort_values('year').reset_index(drop=True)
+    else:
+        history = read_sql("""
+            SELECT res.race_id, TIME_TO_SEC(res.finish_time) AS total_seconds, res.position, res.percentile,
+                   ra.location, ra.year, ra.distance, ra.participants
+            FROM race_results res
+            JOIN runners r ON res.runner_id = r.id
+            JOIN races ra ON res.race_id = ra.id
+            WHERE r.name = %s
+            ORDER BY ra.year
+        """, (runner_name,))
+    history = history.astype(HISTORY_DTYPES)
+    history['minutes'] = history['total_seconds'].astype('float64') / 60
+    return history
@@ -0,0 +1,109 @@
+import os
+import time
+import random
+import logging
+import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+# Configuration
+DB_POOL_SIZE=int(os.getenv('DB_POOL_SIZE', '5'))
+DB_CONNECT_RETRIES=int(os.getenv('DB_CONNECT_RETRIES', '5'))
+DB_RETRY_BASE_SECS=float(os.getenv('DB_RETRY_BASE_SECS', '0.5'))
+DB_RETRY_MAX_SECS=float(os.getenv('DB_RETRY_MAX_SECS', '10'))
+# Queries slower than this are always logged, the rest only with DB_LOG_LEVEL=DEBUG
+DB_SLOW_QUERY_MS=float(os.getenv('DB_SLOW_QUERY_MS', '500'))
+
+# Connection handling shared by the importer, the spider pipeline and the dashboard:
+# a MySQL connection pool checked before every use, retries with exponential backoff
+# and jitter, and per-query timings on the 'sansilvestre.db' logger and in the metrics
+# file (per statement kind, see metrics.py).
+
+logger = logging.getLogger('sansilvestre.db')
+logger.setLevel(os.getenv('DB_LOG_LEVEL', 'INFO').upper())
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s [%(name)s] %(levelname)s: %(message)s'))
+    logger.addHandler(handler)
+    logger.propagate = False
+
+# "Full jitter": a random wait up to a cap that doubles on every attempt, so
+# workers that failed together don't all retry at the same moment
+def backoff_delay(attempt, base=DB_RETRY_BASE_SECS, cap=DB_RETRY_MAX_SECS):
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def connect_with_retry(backend, retries=DB_CONNECT_RETRIES):
+    for attempt in range(retries):
+        try:
+            return backend.connect()
+        except backend.Error as e:
+            if attempt == retries - 1:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"Connection to {backend} failed ({e}), retrying in {delay:.1f}s "
+                           f"(attempts remaining: {retries - attempt - 1})")
+            time.sleep(delay)
+
+def log_query(query, elapsed, rows=None):
+    kind = metrics.statement_kind(str(query))
+    metrics.observe('db_query', elapsed, statement=kind)
+    if rows is not None:
+        metrics.inc('db_rows', rows, statement=kind)
+    ms = elapsed * 1000
+    statement = ' '.join(str(query).split())[:120]
+    suffix = f" ({rows} rows)" if rows is not None else ""
+    if ms >= DB_SLOW_QUERY_MS:
+        logger.warning(f"Slow query {ms:.1f} ms{suffix}: {statement}")
+    else:
+        logger.debug(f"{ms:.1f} ms{suffix}: {statement}")
+
+# Times execute/executemany of any DB-API cursor
+class TimedCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, query, params=()):
+        start = time.perf_counter()
+        try:
+            return self.cursor.execute(query, params)
+        finally:
+            log_query(query, time.perf_counter() - start)
+
+    def executemany(self, query, rows):
+        start = time.perf_counter()
+        try:
+            return self.cursor.executemany(query, rows)
+        finally:
+            log_query(query, time.perf_counter() - start, len(rows))
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+# MySQLConnectionPool whose connections are pinged (and reconnected if the server
+# dropped them) when they are handed out. close() gives them back to the pool.
+# get_connection() doesn't wait for a free connection, so when all of them are in use
+# (more concurrent dashboard sessions than DB_POOL_SIZE) a one-off connection is opened
+class MySQLPool:
+    def __init__(self, config, size=DB_POOL_SIZE, name='sansilvestre'):
+        # Only needed when this backend is used
+        import mysql.connector
+        from mysql.connector import pooling, errors
+        self.connector = mysql.connector
+        self.config = config
+        self.Error = errors.Error
+        self.PoolError = errors.PoolError
+        self.pool = pooling.MySQLConnectionPool(pool_name=name, pool_size=size, pool_reset_session=True, **config)
+
+    def get(self):
+        try:
+            conn = self.pool.get_connection()
+        except self.PoolError:
+            logger.debug(f"Pool exhausted ({self.pool.pool_size} connections in use), opening a one-off connection")
+            return self.connector.connect(**self.config)
+        try:
+            conn.ping(reconnect=True, attempts=1, delay=0)
+        except self.Error:
+            # Back to the pool, it reconnects it the next time it's handed out
+            conn.close()
+            raise
+        return conn
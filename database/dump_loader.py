@@ -0,0 +1,194 @@
+import re
+import time
+import hashlib
+import argparse
+import metrics
+from datetime import datetime
+from storage import get_backend
+from snapshot import update_snapshot
+from import_data import connect_to_db, migrate_schema, update_race_stats
+
+# Configuration
+DUMP_FILE='exported_data.sql'
+BATCH_SIZE=5000
+# Child tables first, so nothing is left pointing to a deleted row
+TABLES=['race_histogram', 'race_summary', 'race_results', 'races', 'runners', 'import_manifest']
+
+# Loads a mysqldump (like exported_data.sql) without a MySQL server: the multi-row
+# INSERT statements are parsed as the file is read and inserted in batches into the
+# database set in .env, usually the embedded SQLite one. Memory stays bounded by
+# the read chunk and the batch, whatever the size of each INSERT.
+
+CREATE_TABLE=re.compile(r"CREATE TABLE `(\w+)`")
+COLUMN=re.compile(r"\s+`(\w+)`")
+INSERT=re.compile(r"INSERT INTO `(\w+)`(?: \(([^)]*)\))? VALUES ")
+# One complete (...) tuple, parentheses and commas inside quoted strings included
+TUPLE=re.compile(r"\((?:[^'()]|'(?:[^'\\]|\\.|'')*')*\)", re.DOTALL)
+FIELD=re.compile(r"'((?:[^'\\]|\\.|'')*)'|([^,]+)", re.DOTALL)
+ESCAPE=re.compile(r"\\(.)|''", re.DOTALL)
+ESCAPES={'0': '\0', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a'}
+
+def unescape(text):
+    return ESCAPE.sub(lambda m: "'" if m.group(1) is None else ESCAPES.get(m.group(1), m.group(1)), text)
+
+def parse_value(text):
+    if text == 'NULL':
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+def parse_tuple(text):
+    return tuple(unescape(m.group(1)) if m.group(1) is not None else parse_value(m.group(2))
+                 for m in FIELD.finditer(text, 1, len(text) - 1))
+
+# Yields (table, columns, rows) batches from every INSERT of the dump. The columns
+# come from the INSERT column list or else from the table's CREATE TABLE
+def read_dump(path, batch_size=BATCH_SIZE, chunk_size=1 << 20):
+    columns = {}
+    creating = None
+    table, rows = None, []
+    buffer, pos, eof = '', 0, False
+    with open(path, encoding='utf-8') as f:
+        while True:
+            if table is not None:
+                # Inside VALUES: one tuple at a time, separated by ',' and ended by ';'
+                while True:
+                    if buffer.startswith(',', pos):
+                        pos += 1
+                    match = TUPLE.match(buffer, pos)
+                    if not match:
+                        break
+                    rows.append(parse_tuple(match.group()))
+                    pos = match.end()
+                    if len(rows) >= batch_size:
+                        yield table, columns[table], rows
+                        rows = []
+                if buffer.startswith(';', pos):
+                    if rows:
+                        yield table, columns[table], rows
+                    table, rows = None, []
+                    pos += 1
+                    continue
+            else:
+                match = INSERT.match(buffer, pos)
+                if match:
+                    table = match.group(1)
+                    if match.group(2):
+                        columns[table] = [c.strip(' `') for c in match.group(2).split(',')]
+                    pos = match.end()
+                    continue
+                end = buffer.find('\n', pos)
+                if end != -1:
+                    line = buffer[pos:end]
+                    pos = end + 1
+                    create = CREATE_TABLE.match(line)
+                    if create:
+                        creating = create.group(1)
+                        columns[creating] = []
+                    elif creating and line.startswith(')'):
+                        creating = None
+                    elif creating and COLUMN.match(line):
+                        columns[creating].append(COLUMN.match(line).group(1))
+                    continue
+
+            # The next tuple or line continues in the following chunk
+            if eof:
+                if buffer[pos:].strip():
+                    raise ValueError(f"Unexpected end of dump near: {buffer[pos:pos + 80]!r}")
+                return
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+# Replaces the content of the database with the dump, like replaying it would
+def load_dump(dump_file=DUMP_FILE, batch_size=BATCH_SIZE, backend=None):
+    backend = backend or get_backend()
+    conn = connect_to_db(backend)
+    if not conn:
+        print(f"❌ Connection to {backend} failed.")
+        return
+
+    cursor = backend.cursor(conn)
+    try:
+        backend.create_tables(cursor)
+        migrate_schema(cursor, backend)
+        conn.commit()
+        print(f"Loading '{dump_file}' into the {backend}, please wait...")
+        start = time.perf_counter()
+
+        backend.foreign_keys(cursor, False)
+        for name in TABLES:
+            cursor.execute(f"DELETE FROM {name}")
+
+        targets = {}
+        counts = {}
+        # Row count and order independent hash of the results of each race, for the manifest
+        races = {}
+        for name, columns, rows in read_dump(dump_file, batch_size):
+            if name not in targets:
+                known = backend.column_names(cursor, name) if name in TABLES else set()
+                targets[name] = [i for i, column in enumerate(columns) if column in known]
+                if not targets[name]:
+                    print(f"⚠️ Table '{name}' is not in the schema, skipped")
+            keep = targets[name]
+            if not keep:
+                continue
+            cursor.executemany(f"""
+                INSERT IGNORE INTO {name} ({', '.join(columns[i] for i in keep)})
+                VALUES ({', '.join(['%s'] * len(keep))})
+            """, [tuple(row[i] for i in keep) for row in rows])
+            counts[name] = counts.get(name, 0) + len(rows)
+
+            if name == 'race_results':
+                race_column = columns.index('race_id')
+                for row in rows:
+                    race = races.setdefault(row[race_column], [0, 0])
+                    race[0] += 1
+                    race[1] = (race[1] + int.from_bytes(hashlib.sha256(repr(row).encode('utf-8')).digest(), 'big')) % (1 << 256)
+        conn.commit()
+        backend.foreign_keys(cursor, True)
+
+        # Positions, summaries and manifest as if the races had been imported
+        cursor.execute("SELECT id, location, year FROM races")
+        race_rows = cursor.fetchall()
+        update_race_stats(cursor, backend, [race_id for race_id, _, _ in race_rows])
+        now = datetime.now().replace(microsecond=0).isoformat(sep=' ')
+        cursor.executemany("""
+            INSERT INTO import_manifest (location, year, row_count, content_hash, imported_at)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [(location, year, races.get(race_id, [0, 0])[0], f"{races.get(race_id, [0, 0])[1]:064x}", now)
+              for race_id, location, year in race_rows])
+        conn.commit()
+
+        elapsed = time.perf_counter() - start
+        total = sum(counts.values())
+        print(", ".join(f"{count} {name}" for name, count in counts.items()))
+        print(f"{total} rows loaded in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} rows/sec)")
+        for name, count in counts.items():
+            metrics.inc('dump_rows', count, table=name)
+        metrics.observe('dump_load', elapsed)
+        metrics.set_value('dump_rows_per_sec', round(total / max(elapsed, 1e-9)))
+        update_snapshot(cursor)
+        print(f"\\(^-^)/ Done!\nThe dump was loaded into the {backend} successfully")
+
+    except backend.Error as e:
+        print(f"SQL error: {e}")
+    except (FileNotFoundError, IsADirectoryError):
+        print(f"'{dump_file}' does not exist or is a directory.")
+    except ValueError as e:
+        print(f"Invalid dump '{dump_file}': {e}")
+    finally:
+        cursor.close()
+        conn.close()
+        metrics.flush('dump_loader')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load a mysqldump file into the database without a MySQL server")
+    parser.add_argument('--file', default=DUMP_FILE, help="mysqldump file with multi-row INSERT statements")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="rows per batched INSERT")
+    args = parser.parse_args()
+    with metrics.profiled('dump_loader'):
+        load_dump(args.file, batch_size=args.batch_size)
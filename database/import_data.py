@@ -1,127 +1,539 @@
+import os
 import json
 import time
-import mysql.connector
-from mysql.connector import Error
-import os
-from dotenv import load_dotenv
+import hashlib
+import argparse
+import tempfile
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import storage
+import metrics
+from storage import get_backend, name_key, ALL
+from snapshot import update_snapshot
+from connection import connect_with_retry
 
-load_dotenv()
 # Configuration
 JSON_FILE='../data/carrera_san_silvestre.json'
-DB_CONFIG={
-    'host': os.getenv('DB_HOST'),
-    'user': os.getenv('DB_USER'),
-    'password': os.getenv('DB_PASSWORD'),
-    'database': os.getenv('DB_NAME')
-}
-
-def create_tables(cursor):
-    # 'runners' table
+BATCH_SIZE=1000
+# Editions that failed in a parallel import (--workers), retried by running it again
+FAILURE_REPORT='../data/import_failures.json'
+SUMMARY_BINS=30
+
+# Bring tables created by older versions up to the current schema
+def migrate_schema(cursor, backend):
+    indexes = backend.index_names(cursor, 'race_results')
+
+    if 'uq_runner_race' not in indexes:
+        # Older imports could store the same result twice, keep the first one
+        cursor.execute("""
+        DELETE FROM race_results WHERE id NOT IN (
+            SELECT id FROM (SELECT MIN(id) AS id FROM race_results GROUP BY runner_id, race_id) AS first_results
+        )
+        """)
+        cursor.execute("CREATE UNIQUE INDEX uq_runner_race ON race_results (runner_id, race_id)")
+    # The foreign key already created an index called 'race_id' on old tables
+    if not indexes & {'race_id', 'idx_race_id'}:
+        cursor.execute("CREATE INDEX idx_race_id ON race_results (race_id)")
+    if 'idx_finish_time' not in indexes:
+        cursor.execute("CREATE INDEX idx_finish_time ON race_results (finish_time)")
+
+    # Rankings stored at import time, filled in for the races already imported
+    new_columns = []
+    if 'participants' not in backend.column_names(cursor, 'races'):
+        cursor.execute("ALTER TABLE races ADD COLUMN participants INT")
+        new_columns.append('participants')
+    result_columns = backend.column_names(cursor, 'race_results')
+    for column, definition in (('position', 'INT'), ('percentile', 'FLOAT')):
+        if column not in result_columns:
+            cursor.execute(f"ALTER TABLE race_results ADD COLUMN {column} {definition}")
+            new_columns.append(column)
+    if new_columns:
+        cursor.execute("SELECT id FROM races")
+        update_race_stats(cursor, backend, [row[0] for row in cursor.fetchall()])
+
+    # Summaries for races imported before race_summary existed
+    cursor.execute("SELECT id FROM races WHERE id NOT IN (SELECT race_id FROM race_summary)")
+    for (race_id,) in cursor.fetchall():
+        update_race_summary(cursor, race_id)
+
+# Field size of each race and position/percentile of its results, so the
+# dashboard reads them instead of sorting the whole field on every click
+def update_race_stats(cursor, backend, race_ids):
+    for race_id in race_ids:
+        cursor.execute("""
+            UPDATE races SET participants = (SELECT COUNT(*) FROM race_results WHERE race_id = %s)
+            WHERE id = %s
+        """, (race_id, race_id))
+        backend.rank_results(cursor, race_id)
+        update_race_summary(cursor, race_id)
+
+# Cut point 'fraction' of sorted seconds, interpolating between neighbours
+def percentile(seconds, fraction):
+    position = (len(seconds) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(seconds) - 1)
+    return round(seconds[lower] + (seconds[upper] - seconds[lower]) * (position - lower))
+
+# Equal width bins between the best and worst time, the last one closed
+def histogram(seconds, bins=SUMMARY_BINS):
+    low, high = seconds[0], seconds[-1]
+    width = (high - low) / bins or 1
+    counts = [0] * bins
+    for value in seconds:
+        counts[min(int((value - low) / width), bins - 1)] += 1
+    return [(i, low + i * width, low + (i + 1) * width, count) for i, count in enumerate(counts)]
+
+# Aggregates the Race Analysis view shows for the whole field, each gender and each
+# age group. Results without gender or age group are left out, like the dashboard filters do
+def update_race_summary(cursor, race_id):
     cursor.execute("""
-    CREATE TABLE IF NOT EXISTS runners (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        name VARCHAR(255) NOT NULL,
-        gender ENUM('M', 'F'),
-        UNIQUE(name)
-    );
-    """)
-
-    # 'races' table
+        SELECT r.gender, res.age_group, TIME_TO_SEC(res.finish_time)
+        FROM race_results res
+        JOIN runners r ON res.runner_id = r.id
+        WHERE res.race_id = %s AND r.gender IS NOT NULL AND res.age_group IS NOT NULL
+    """, (race_id,))
+    groups = {}
+    for gender, age_group, seconds in cursor.fetchall():
+        for key in ((ALL, ALL), (gender, ALL), (ALL, age_group)):
+            groups.setdefault(key, []).append(seconds)
+
+    summaries, bins = [], []
+    for (gender, age_group), values in groups.items():
+        seconds = sorted(value for value in values if value is not None)
+        row = [race_id, gender, age_group, len(values)]
+        if seconds:
+            row += [seconds[0], sum(seconds) / len(seconds), seconds[-1]]
+            row += [percentile(seconds, fraction) for fraction in (0.1, 0.25, 0.5, 0.75, 0.9)]
+            bins += [(race_id, gender, age_group) + b for b in histogram(seconds)]
+        else:
+            row += [None] * 8
+        summaries.append(row)
+
+    cursor.execute("DELETE FROM race_histogram WHERE race_id = %s", (race_id,))
+    cursor.execute("DELETE FROM race_summary WHERE race_id = %s", (race_id,))
+    if summaries:
+        cursor.executemany("""
+            INSERT INTO race_summary (race_id, gender, age_group, participants, best, average, worst, p10, p25, median, p75, p90)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, summaries)
+    if bins:
+        cursor.executemany("""
+            INSERT INTO race_histogram (race_id, gender, age_group, bin_index, bin_start, bin_end, finishers)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, bins)
+
+def edition_race_ids(cursor, editions):
+    race_ids = []
+    for edition in editions:
+        cursor.execute("SELECT id FROM races WHERE location = %s AND year = %s", (edition['location'], edition['year']))
+        race = cursor.fetchone()
+        if race:
+            race_ids.append(race[0])
+    return race_ids
+
+def connect_to_db(backend):
+    try:
+        return connect_with_retry(backend)
+    except backend.Error:
+        return None
+
+def race_key(location, year):
+    return (name_key(location), str(year))
+
+# Stream entries one at a time from a JSON Lines file or a JSON array,
+# so memory does not grow with the size of the crawl
+def read_entries(path, chunk_size=1 << 16):
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.jsonl', '.jl')):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buffer, pos, started = '', 0, False
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) and not started:
+                if buffer[pos] != '[':
+                    raise ValueError(f"'{path}' is not a JSON array")
+                pos, started = pos + 1, True
+                continue
+            if pos < len(buffer):
+                if buffer[pos] == ']':
+                    return
+                try:
+                    item, pos = decoder.raw_decode(buffer, pos)
+                    yield item
+                    continue
+                except json.JSONDecodeError:
+                    pass  # Entry cut at the end of the buffer
+
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise ValueError(f"'{path}' ends before the JSON array is closed")
+            buffer, pos = buffer[pos:] + chunk, 0
+
+def chunked(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+# Bulk mode: races and runners are resolved in memory and every table is written
+# with executemany, which mysql.connector sends as multi-row INSERTs.
+# With preload_runners=False only the runners of each batch are looked up, for
+# loaders that see a small part of a big runners table (parallel import workers)
+class BulkLoader:
+    def __init__(self, cursor, batch_size=BATCH_SIZE, preload_runners=True):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.pending = []
+
+        self.races = {}
+        self.load_races()
+
+        self.runners = {}
+        self.preloaded = preload_runners
+        if preload_runners:
+            cursor.execute("SELECT id, name FROM runners")
+            for runner_id, name in cursor.fetchall():
+                self.runners[name_key(name)] = runner_id
+
+
+    def load_races(self):
+        self.cursor.execute("SELECT id, location, year FROM races")
+        for race_id, location, year in self.cursor.fetchall():
+            self.races[race_key(location, year)] = race_id
+
+    def add(self, item):
+        self.pending.append(item)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        items, self.pending = self.pending, []
+        if not items:
+            return
+        self.resolve(items)
+
+        # Insert results, the (runner_id, race_id) unique key skips duplicate entries
+        results = []
+        for item in items:
+            runner_id = self.runners[name_key(item['runner_name'])]
+            race_id = self.races[race_key(item['location'], item['race_date'])]
+            results.append((runner_id, race_id, item['finish_time'], item['age_group']))
+        for chunk in chunked(results, self.batch_size):
+            self.cursor.executemany("""
+                INSERT IGNORE INTO race_results (runner_id, race_id, finish_time, age_group)
+                VALUES (%s, %s, %s, %s)
+            """, chunk)
+
+    # Creates the races and runners of 'items' that are not in the database yet
+    def resolve(self, items):
+        # Insert races (first entry of an edition sets its distance)
+        new_races = {}
+        for item in items:
+            key = race_key(item['location'], item['race_date'])
+            if key not in self.races and key not in new_races:
+                new_races[key] = (item['location'], item['race_date'], item['race_distance'])
+        # Keys are already de-duplicated, so a plain INSERT fails (like the row by row import)
+        # on a row the table rejects instead of skipping it and leaving it unresolved
+        if new_races:
+            self.cursor.executemany("INSERT INTO races (location, year, distance) VALUES (%s, %s, %s)",
+                                    list(new_races.values()))
+            self.load_races()
+
+        # Insert runners (first entry of a runner sets its gender)
+        new_runners = {}
+        for item in items:
+            key = name_key(item['runner_name'])
+            if key not in self.runners and key not in new_runners:
+                new_runners[key] = (item['runner_name'], item['gender'])
+        if not self.preloaded:
+            for chunk in chunked(list(new_runners.values()), self.batch_size):
+                self.lookup_runners([name for name, _ in chunk])
+            new_runners = {key: runner for key, runner in new_runners.items() if key not in self.runners}
+        for chunk in chunked(list(new_runners.values()), self.batch_size):
+            self.cursor.executemany("INSERT INTO runners (name, gender) VALUES (%s, %s)", chunk)
+            self.lookup_runners([name for name, _ in chunk])
+
+    def lookup_runners(self, names):
+        placeholders = ', '.join(['%s'] * len(names))
+        self.cursor.execute(f"SELECT id, name FROM runners WHERE name IN ({placeholders})", names)
+        for runner_id, name in self.cursor.fetchall():
+            self.runners[name_key(name)] = runner_id
+
+# Add an entry to the row count and content hash of its edition. The hash is a sum
+# of per-entry hashes, so it does not depend on the order the spider wrote them in
+def track_edition(editions, item):
+    key = race_key(item['location'], item['race_date'])
+    edition = editions.setdefault(key, {
+        'location': item['location'],
+        'year': item['race_date'],
+        'distance': item['race_distance'],
+        'rows': 0,
+        'sum': 0
+    })
+    digest = hashlib.sha256(json.dumps(item, sort_keys=True, ensure_ascii=False).encode('utf-8')).digest()
+    edition['rows'] += 1
+    edition['sum'] = (edition['sum'] + int.from_bytes(digest, 'big')) % (1 << 256)
+    edition['hash'] = f"{edition['sum']:064x}"
+    return edition
+
+def scan_editions(json_file):
+    editions = {}
+    for item in read_entries(json_file):
+        track_edition(editions, item)
+    return editions
+
+def load_manifest(cursor):
+    cursor.execute("SELECT location, year, content_hash FROM import_manifest")
+    return {race_key(location, year): content_hash for location, year, content_hash in cursor.fetchall()}
+
+# Remove the stored results of an edition that is going to be imported again
+def clear_edition(cursor, edition):
     cursor.execute("""
-    CREATE TABLE IF NOT EXISTS races (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        location VARCHAR(255) NOT NULL,
-        year INT NOT NULL,
-        distance VARCHAR(100),
-        UNIQUE(location, year)
-    );
-    """)
-
-    # 'results' table
+        DELETE FROM race_results
+        WHERE race_id IN (SELECT id FROM races WHERE location = %s AND year = %s)
+    """, (edition['location'], edition['year']))
+    cursor.execute("UPDATE races SET distance = %s WHERE location = %s AND year = %s",
+                   (edition['distance'], edition['location'], edition['year']))
+
+def save_manifest(cursor, editions):
+    now = datetime.now().replace(microsecond=0).isoformat(sep=' ')
+    cursor.executemany("""
+        REPLACE INTO import_manifest (location, year, row_count, content_hash, imported_at)
+        VALUES (%s, %s, %s, %s, %s)
+    """, [(e['location'], e['year'], e['rows'], e['hash'], now) for e in editions])
+
+def insert_item(cursor, item):
+    # Insert race
+    cursor.execute("SELECT id FROM races WHERE location = %s AND year = %s", 
+                   (item['location'], item['race_date']))
+    race = cursor.fetchone()
+    if race:
+        race_id = race[0]
+    else:
+        cursor.execute("INSERT INTO races (location, year, distance) VALUES (%s, %s, %s)", 
+                       (item['location'], item['race_date'], item['race_distance']))
+        race_id = cursor.lastrowid
+
+    # Insert runner
+    cursor.execute("SELECT id FROM runners WHERE name = %s", (item['runner_name'],))
+    runner = cursor.fetchone()
+    if runner:
+        runner_id = runner[0]
+    else:
+        cursor.execute("INSERT INTO runners (name, gender) VALUES (%s, %s)", 
+                       (item['runner_name'], item['gender']))
+        runner_id = cursor.lastrowid
+
+    # Insert result (duplicate entries are skipped by the unique key)
     cursor.execute("""
-    CREATE TABLE IF NOT EXISTS race_results (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        runner_id INT NOT NULL,
-        race_id INT NOT NULL,
-        finish_time TIME,
-        age_group VARCHAR(35),
-        FOREIGN KEY (runner_id) REFERENCES runners(id) ON DELETE CASCADE,
-        FOREIGN KEY (race_id) REFERENCES races(id) ON DELETE CASCADE
-    );
-    """)
-
-def connect_to_db():
-    retries=5
-    while retries>0:
-        try:
-            connection=mysql.connector.connect(**DB_CONFIG)
-            return connection
-        except Error:
-            print(f"Trying to connect to MySQL database...\nAttempts remaining: {retries}")
-            time.sleep(3)
-            retries-=1
-    return None
-
-def import_data():
-    conn = connect_to_db()
+        INSERT IGNORE INTO race_results (runner_id, race_id, finish_time, age_group)
+        VALUES (%s, %s, %s, %s)
+    """, (runner_id, race_id, item['finish_time'], item['age_group']))
+
+# Parallel import, step 1: a single pass over the input creates the races and runners
+# of the changed editions, so workers never insert the same runner, and writes each
+# edition to its own JSON Lines shard
+def split_editions(cursor, json_file, changed, shard_dir, batch_size=BATCH_SIZE):
+    loader = BulkLoader(cursor, batch_size)
+    shards = {key: open(os.path.join(shard_dir, f"edition_{i}.jsonl"), 'w', encoding='utf-8')
+              for i, key in enumerate(changed)}
+    pending = []
+    try:
+        for item in read_entries(json_file):
+            key = race_key(item['location'], item['race_date'])
+            if key not in shards:
+                continue
+            shards[key].write(json.dumps(item, ensure_ascii=False) + '\n')
+            pending.append(item)
+            if len(pending) >= batch_size:
+                loader.resolve(pending)
+                pending = []
+        loader.resolve(pending)
+    finally:
+        for shard in shards.values():
+            shard.close()
+    return {key: shard.name for key, shard in shards.items()}
+
+# Workers are forked with the parent's backends and metrics, they must open their own
+# connections and only report what they measure themselves
+def reset_backends():
+    storage.instances.clear()
+    metrics.reset()
+
+# Parallel import, step 2: one edition over its own connection, committed on its own.
+# Returns its row count and metrics, merged by the parent
+def import_shard(backend_name, shard_file, edition, batch_size=BATCH_SIZE):
+    start = time.perf_counter()
+    backend = get_backend(backend_name)
+    conn = connect_to_db(backend)
+    if not conn:
+        raise ConnectionError(f"Connection to {backend} failed")
+    cursor = backend.cursor(conn)
+    try:
+        clear_edition(cursor, edition)
+        # Runners were created by split_editions, each batch only looks up its own
+        loader = BulkLoader(cursor, batch_size, preload_runners=False)
+        count = 0
+        for item in read_entries(shard_file):
+            loader.add(item)
+            count += 1
+        loader.flush()
+        update_race_stats(cursor, backend, edition_race_ids(cursor, [edition]))
+        save_manifest(cursor, [edition])
+        conn.commit()
+        metrics.inc('import_rows', count, location=edition['location'], year=edition['year'])
+        metrics.observe('import_edition', time.perf_counter() - start, location=edition['location'], year=edition['year'])
+        return count, metrics.collect()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def import_parallel(conn, cursor, backend, json_file, changed, batch_size=BATCH_SIZE, workers=2):
+    count, failures = 0, []
+    with tempfile.TemporaryDirectory() as shard_dir:
+        shards = split_editions(cursor, json_file, changed, shard_dir, batch_size)
+        conn.commit()
+        print(f"Races and runners resolved, importing {len(shards)} edition(s) with {workers} workers...")
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=reset_backends) as pool:
+            futures = {pool.submit(import_shard, backend.name, shards[key], edition, batch_size): edition
+                       for key, edition in changed.items()}
+            for future in as_completed(futures):
+                edition = futures[future]
+                try:
+                    rows, measured = future.result()
+                    metrics.merge(measured)
+                    count += rows
+                    print(f"✅ {edition['location']} {edition['year']}: {rows} entries")
+                except Exception as e:
+                    failures.append({'location': edition['location'], 'year': edition['year'],
+                                     'rows': edition['rows'], 'error': f"{type(e).__name__}: {e}"})
+                    print(f"❌ {edition['location']} {edition['year']}: {e}")
+    write_failure_report(json_file, failures)
+    return count, failures
+
+# Editions that were not committed. The manifest only has the ones that were, so
+# running the same import again retries exactly these
+def write_failure_report(json_file, failures, path=FAILURE_REPORT):
+    if not failures:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'file': json_file, 'created_at': datetime.now().isoformat(timespec='seconds'),
+                   'failed': failures}, f, ensure_ascii=False, indent=2)
+    print(f"⚠️ {len(failures)} edition(s) failed, see '{path}'. Run the same import again to retry them")
+
+def record_import(mode, count, elapsed):
+    metrics.observe('import', elapsed, mode=mode)
+    metrics.set_value('import_rows_per_sec', round(count / max(elapsed, 1e-9)), mode=mode)
+
+def import_data(json_file=JSON_FILE, bulk=False, batch_size=BATCH_SIZE, full=False, backend=None, workers=1):
+    backend = backend or get_backend()
+    conn = connect_to_db(backend)
     if not conn:
-        print("❌ Connection to MySQL/Docker failed.")
+        print(f"❌ Connection to {backend} failed.")
         return
 
+    cursor = backend.cursor(conn)
+    mode = 'parallel' if workers > 1 else 'bulk' if bulk else 'single'
+    stages = metrics.Phases('import_stage', mode=mode)
     try:
-        cursor = conn.cursor()
-        
         # Create structure
-        create_tables(cursor)
-
-        # Load .json file
-        with open(JSON_FILE, 'r', encoding='utf-8') as f: data = json.load(f)
-
-        print(f"Processing {len(data)} entries, please wait...")
-
-        # Insert data
-        for item in data:
-            # Insert race
-            cursor.execute("SELECT id FROM races WHERE location = %s AND year = %s", 
-                           (item['location'], item['race_date']))
-            race = cursor.fetchone()
-            if race:
-                race_id = race[0]
-            else:
-                cursor.execute("INSERT INTO races (location, year, distance) VALUES (%s, %s, %s)", 
-                               (item['location'], item['race_date'], item['race_distance']))
-                race_id = cursor.lastrowid
-
-            # Insert runner
-            cursor.execute("SELECT id FROM runners WHERE name = %s", (item['runner_name'],))
-            runner = cursor.fetchone()
-            if runner:
-                runner_id = runner[0]
-            else:
-                cursor.execute("INSERT INTO runners (name, gender) VALUES (%s, %s)", 
-                               (item['runner_name'], item['gender']))
-                runner_id = cursor.lastrowid
-
-            # Insert result
-            # Check for duplicate entry
-            cursor.execute("SELECT id FROM race_results WHERE runner_id = %s AND race_id = %s", (runner_id, race_id))
-            if not cursor.fetchone():
-                cursor.execute("""
-                    INSERT INTO race_results (runner_id, race_id, finish_time, age_group)
-                    VALUES (%s, %s, %s, %s)
-                """, (runner_id, race_id, item['finish_time'], item['age_group']))
+        stages('schema')
+        backend.create_tables(cursor)
+        migrate_schema(cursor, backend)
+        conn.commit()
+
+        # Stream .json/.jsonl file
+        print(f"Processing '{json_file}', please wait...")
+        start = time.perf_counter()
+        count = 0
+
+        # Only editions whose content changed since the last import are replaced
+        stages('scan')
+        editions = scan_editions(json_file)
+        manifest = {} if full else load_manifest(cursor)
+        changed = {key: e for key, e in editions.items() if manifest.get(key) != e['hash']}
+        print(f"{len(changed)} edition(s) to import, {len(editions) - len(changed)} unchanged")
+        if not changed:
+            stages('snapshot')
+            update_snapshot(cursor)
+            return
+
+        if workers > 1:
+            stages('load')
+            count, failures = import_parallel(conn, cursor, backend, json_file, changed, batch_size, workers)
+            elapsed = time.perf_counter() - start
+            print(f"{count} entries imported in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} rows/sec)")
+            record_import(mode, count, elapsed)
+            stages('snapshot')
+            update_snapshot(cursor)
+            if not failures:
+                print(f"\\(^-^)/ Done!\nAll data was imported to the {backend} successfully")
+            return
+
+        stages('load')
+        for edition in changed.values():
+            clear_edition(cursor, edition)
+
+        entries = (item for item in read_entries(json_file)
+                   if race_key(item['location'], item['race_date']) in changed)
+        if bulk:
+            loader = BulkLoader(cursor, batch_size)
+            for item in entries:
+                loader.add(item)
+                count += 1
+            loader.flush()
+        else:
+            # Insert data
+            for item in entries:
+                insert_item(cursor, item)
+                count += 1
 
+        stages('stats')
+        update_race_stats(cursor, backend, edition_race_ids(cursor, changed.values()))
+        save_manifest(cursor, changed.values())
         conn.commit()
-        print(f"\(^-^)/ Done!\nAll data was imported to '{DB_CONFIG['database']}' successfully\n\nSTEPS TO ENTER IN THE DATABASE\n1. Execute the following command in a terminal:\n-  docker exec -it carrera_mysql mysql -u root -p\n2. Enter the following MySQL database password:\n-  {DB_CONFIG['password']}\n3. Enter in the database:\n- USE sansilvestre_db;\n\nAnd now you're in! We hope\nthat everything went ok :)")
+        elapsed = time.perf_counter() - start
+        print(f"{count} entries imported in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} rows/sec)")
+        for edition in changed.values():
+            metrics.inc('import_rows', edition['rows'], location=edition['location'], year=edition['year'])
+        record_import(mode, count, elapsed)
+        # Columnar copy the dashboard starts from
+        stages('snapshot')
+        update_snapshot(cursor)
+        print(f"\\(^-^)/ Done!\nAll data was imported to the {backend} successfully")
+        if backend.name == 'mysql':
+            print(f"\nSTEPS TO ENTER IN THE DATABASE\n1. Execute the following command in a terminal:\n-  docker exec -it carrera_mysql mysql -u root -p\n2. Enter the following MySQL database password:\n-  {backend.config['password']}\n3. Enter in the database:\n- USE sansilvestre_db;\n\nAnd now you're in! We hope\nthat everything went ok :)")
 
-    except Error as e:
+    except backend.Error as e:
         print(f"SQL error: {e}")
-    except FileNotFoundError:
-        print(f"'{JSON_FILE}' does not exist or is a directory.")
+    except (FileNotFoundError, IsADirectoryError):
+        print(f"'{json_file}' does not exist or is a directory.")
+    except ValueError as e:
+        print(f"Invalid JSON in '{json_file}': {e}")
     finally:
-        if conn and conn.is_connected():
-            cursor.close()
-            conn.close()
+        cursor.close()
+        conn.close()
+        stages.stop()
+        metrics.flush('importer')
 
 if __name__ == "__main__":
-    import_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Import scraped race results into the database")
+    parser.add_argument('--file', default=JSON_FILE, help="crawl output as a JSON array or JSON Lines (.jsonl)")
+    parser.add_argument('--bulk', action='store_true', help="resolve ids in memory and insert in batches")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="rows per batched INSERT")
+    parser.add_argument('--full', action='store_true', help="import every edition, even if unchanged since the last import")
+    parser.add_argument('--workers', type=int, default=1, help="import editions in parallel with this many processes")
+    args = parser.parse_args()
+    with metrics.profiled('import'):
+        import_data(args.file, bulk=args.bulk, batch_size=args.batch_size, full=args.full, workers=args.workers)
@@ -0,0 +1,191 @@
+import os
+import re
+import json
+import time
+import logging
+import cProfile
+from datetime import datetime
+from functools import lru_cache
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+# Configuration
+# Relative paths are resolved from this folder, like SQLITE_PATH. Empty disables the file
+METRICS_FILE=os.getenv('METRICS_FILE', '../data/metrics.jsonl')
+# 'jsonl' appends what was measured since the last flush, one line per metric.
+# 'prometheus' rewrites <METRICS_FILE without extension>.<source>.prom with the totals
+METRICS_FORMAT=os.getenv('METRICS_FORMAT', 'jsonl')
+# Folder for cProfile dumps (.prof) of the profiled() sections, empty disables profiling
+METRICS_PROFILE_DIR=os.getenv('METRICS_PROFILE_DIR', '')
+
+# Counters, gauges and timers shared by the spider, the importer and the dashboard.
+# Each process keeps them in memory and flush(source) writes them to the metrics
+# file, tagged with the source and the run, so two runs can be scraped or diffed.
+
+logger = logging.getLogger('sansilvestre.metrics')
+
+# (name, labels) -> value
+counters = {}
+gauges = {}
+# (name, labels) -> [count, total seconds, max seconds]
+timers = {}
+run_id = f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+
+# First keyword and first table of a statement ("INSERT race_results"), as a low cardinality label
+STATEMENT=re.compile(r"\s*(\w+)(?:.*?\b(?:INTO|FROM|TABLE|ON)\s+(?:IF\s+NOT\s+EXISTS\s+)?|\s+)?`?(\w+)?", re.IGNORECASE | re.DOTALL)
+
+def resolve(path):
+    if not path:
+        return None
+    return os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), path))
+
+def label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+@lru_cache(maxsize=1024)
+def statement_kind(query):
+    match = STATEMENT.match(query)
+    if not match:
+        return 'OTHER'
+    return ' '.join(part for part in (match.group(1).upper(), match.group(2)) if part)
+
+def inc(name, value=1, **labels):
+    key = (name, label_key(labels))
+    counters[key] = counters.get(key, 0) + value
+
+def set_value(name, value, **labels):
+    gauges[(name, label_key(labels))] = value
+
+def observe(name, seconds, **labels):
+    entry = timers.setdefault((name, label_key(labels)), [0, 0.0, 0.0])
+    entry[0] += 1
+    entry[1] += seconds
+    entry[2] = max(entry[2], seconds)
+
+@contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+# Times consecutive phases of the same piece of code (load, filter, render...):
+# each call closes the running phase and starts the next one, stop() records them
+class Phases:
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.elapsed = {}
+        self.current = None
+        self.started = None
+
+    def __call__(self, phase):
+        now = time.perf_counter()
+        if self.current is not None:
+            self.elapsed[self.current] = self.elapsed.get(self.current, 0.0) + now - self.started
+        self.current, self.started = phase, now
+
+    def stop(self):
+        self(None)
+        for phase, seconds in self.elapsed.items():
+            observe(self.name, seconds, phase=phase, **self.labels)
+        self.elapsed = {}
+
+# cProfile of the block, dumped to METRICS_PROFILE_DIR/<name>-<time>.prof (snakeviz, pstats)
+@contextmanager
+def profiled(name):
+    if not METRICS_PROFILE_DIR:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        folder = resolve(METRICS_PROFILE_DIR)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{name}-{datetime.now():%Y%m%d-%H%M%S}.prof")
+        profiler.dump_stats(path)
+        logger.info(f"Profile written to '{path}'")
+
+# Everything measured since the last reset, to be merged into another process' metrics
+def collect():
+    measured = {'counters': dict(counters), 'gauges': dict(gauges), 'timers': {k: list(v) for k, v in timers.items()}}
+    reset()
+    return measured
+
+def merge(measured):
+    for key, value in measured['counters'].items():
+        counters[key] = counters.get(key, 0) + value
+    gauges.update(measured['gauges'])
+    for key, (count, total, longest) in measured['timers'].items():
+        entry = timers.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += count
+        entry[1] += total
+        entry[2] = max(entry[2], longest)
+
+def reset():
+    counters.clear()
+    gauges.clear()
+    timers.clear()
+
+def jsonl_lines(source):
+    common = {'time': datetime.now().isoformat(timespec='seconds'), 'run': run_id, 'source': source}
+    for kind, registry in (('counter', counters), ('gauge', gauges)):
+        for (name, labels), value in sorted(registry.items()):
+            yield {**common, 'metric': name, 'type': kind, 'labels': dict(labels), 'value': value}
+    for (name, labels), (count, total, longest) in sorted(timers.items()):
+        yield {**common, 'metric': name, 'type': 'timer', 'labels': dict(labels), 'count': count,
+               'sum_secs': round(total, 6), 'max_secs': round(longest, 6)}
+
+def prometheus_labels(source, labels):
+    escaped = (f'{name}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for name, value in (('source', source),) + labels)
+    return '{' + ','.join(escaped) + '}'
+
+# Text exposition format, one family per metric name
+def prometheus_text(source):
+    families = {}
+    for (name, labels), value in sorted(counters.items()):
+        families.setdefault((f"sansilvestre_{name}_total", 'counter'), []).append(
+            f"sansilvestre_{name}_total{prometheus_labels(source, labels)} {value}")
+    for (name, labels), value in sorted(gauges.items()):
+        families.setdefault((f"sansilvestre_{name}", 'gauge'), []).append(
+            f"sansilvestre_{name}{prometheus_labels(source, labels)} {value}")
+    for (name, labels), (count, total, longest) in sorted(timers.items()):
+        metric = f"sansilvestre_{name}_seconds"
+        families.setdefault((metric, 'summary'), []).extend([
+            f"{metric}_count{prometheus_labels(source, labels)} {count}",
+            f"{metric}_sum{prometheus_labels(source, labels)} {total:.6f}"])
+        families.setdefault((f"{metric}_max", 'gauge'), []).append(
+            f"{metric}_max{prometheus_labels(source, labels)} {longest:.6f}")
+    lines = []
+    for (metric, kind), samples in families.items():
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+
+# Writes the metrics of this process. JSON Lines only gets what is new since the
+# previous flush; the Prometheus file always holds the totals of the process
+def flush(source, path=None, fmt=None):
+    path = resolve(path if path is not None else METRICS_FILE)
+    fmt = fmt or METRICS_FORMAT
+    if not path or not (counters or gauges or timers):
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if fmt == 'prometheus':
+            target = f"{os.path.splitext(path)[0]}.{source}.prom"
+            # Scrapers never read a half written file
+            with open(target + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(prometheus_text(source))
+            os.replace(target + '.tmp', target)
+        else:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(line, ensure_ascii=False) + '\n' for line in jsonl_lines(source)))
+            reset()
+    except OSError as e:
+        logger.warning(f"Metrics could not be written to '{path}': {e}")
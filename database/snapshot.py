@@ -0,0 +1,115 @@
+import os
+import json
+import shutil
+import hashlib
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+# Configuration
+# Relative paths are resolved from this folder, like SQLITE_PATH
+SNAPSHOT_DIR=os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.getenv('SNAPSHOT_DIR', '../data/snapshot')))
+# Bumped when the snapshot columns change, so old snapshots are rebuilt
+SNAPSHOT_FORMAT=1
+
+# Columnar copy of races and results written after each import as Arrow IPC files.
+# They are uncompressed so the dashboard can memory-map them instead of running the
+# full join after every restart. Each snapshot lives in a folder named after the import
+# manifest it was built from, and 'current.json' points to the latest one.
+
+# Changes whenever an edition is imported or replaced
+def manifest_version(cursor):
+    cursor.execute("SELECT location, year, row_count, content_hash FROM import_manifest")
+    digest = hashlib.sha256(f"format {SNAPSHOT_FORMAT}".encode())
+    for row in sorted((str(location), int(year), int(rows), str(content_hash)) for location, year, rows, content_hash in cursor.fetchall()):
+        digest.update(repr(row).encode())
+    return digest.hexdigest()[:16]
+
+def current_version(path=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(path, 'current.json'), encoding='utf-8') as f:
+            return json.load(f)['version']
+    except (OSError, ValueError, KeyError):
+        return None
+
+def write_snapshot(cursor, path=SNAPSHOT_DIR):
+    # Only needed when snapshots are written or read
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    version = manifest_version(cursor)
+    cursor.execute("SELECT id, location, year, distance, participants FROM races")
+    races = list(zip(*cursor.fetchall())) or [()] * 5
+    cursor.execute("""
+        SELECT res.race_id, r.name, r.gender, res.age_group, TIME_TO_SEC(res.finish_time), res.position, res.percentile
+        FROM race_results res
+        JOIN runners r ON res.runner_id = r.id
+    """)
+    results = list(zip(*cursor.fetchall())) or [()] * 7
+
+    tables = {
+        'races': pa.table({
+            'race_id': pa.array(races[0], pa.int32()),
+            'location': pa.array(races[1], pa.string()),
+            'year': pa.array(races[2], pa.int32()),
+            'distance': pa.array(races[3], pa.string()),
+            'participants': pa.array(races[4], pa.int32())
+        }),
+        'results': pa.table({
+            'race_id': pa.array(results[0], pa.int32()),
+            # Repeated strings are stored once per value
+            'runner_name': pa.array(results[1], pa.string()).dictionary_encode(),
+            'gender': pa.array(results[2], pa.string()).dictionary_encode(),
+            'age_group': pa.array(results[3], pa.string()).dictionary_encode(),
+            'total_seconds': pa.array([None if s is None else int(s) for s in results[4]], pa.int32()),
+            'position': pa.array(results[5], pa.int32()),
+            'percentile': pa.array(results[6], pa.float32())
+        })
+    }
+
+    folder = os.path.join(path, version)
+    os.makedirs(folder, exist_ok=True)
+    for name, table in tables.items():
+        with ipc.new_file(os.path.join(folder, f'{name}.arrow'), table.schema) as writer:
+            writer.write_table(table)
+
+    # Switch to the new snapshot in one step, readers never see a half written one
+    pointer = os.path.join(path, 'current.json')
+    with open(pointer + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'races': tables['races'].num_rows, 'results': tables['results'].num_rows,
+                   'created_at': datetime.now().isoformat(timespec='seconds')}, f)
+    os.replace(pointer + '.tmp', pointer)
+
+    # Older snapshots, a dashboard still mapping one keeps its open files
+    for name in os.listdir(path):
+        if name != version and os.path.isdir(os.path.join(path, name)):
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+    return version, tables['results'].num_rows
+
+# Memory-maps the snapshot if it was built from 'version', otherwise returns None
+def read_snapshot(version, path=SNAPSHOT_DIR):
+    if current_version(path) != version:
+        return None
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+    except ImportError:
+        return None
+    tables = {}
+    try:
+        for name in ('races', 'results'):
+            source = pa.memory_map(os.path.join(path, version, f'{name}.arrow'))
+            tables[name] = ipc.open_file(source).read_all()
+    except (OSError, pa.ArrowException):
+        return None
+    return tables
+
+# Rebuilds the snapshot when the database changed since the last one
+def update_snapshot(cursor, path=SNAPSHOT_DIR):
+    try:
+        if current_version(path) == manifest_version(cursor):
+            return
+        version, rows = write_snapshot(cursor, path)
+        print(f"📦 Snapshot {version} written to '{path}' ({rows} results)")
+    except ImportError:
+        print("⚠️ pyarrow is not installed, snapshot skipped")
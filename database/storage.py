@@ -0,0 +1,350 @@
+import os
+import sqlite3
+import unicodedata
+from functools import lru_cache
+from dotenv import load_dotenv
+from connection import MySQLPool, TimedCursor
+
+load_dotenv()
+# Configuration
+DB_BACKEND=os.getenv('DB_BACKEND', 'mysql')
+# Relative paths are resolved from this folder, so every script finds the same file
+SQLITE_PATH=os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.getenv('SQLITE_PATH', '../data/sansilvestre.db')))
+DB_CONFIG={
+    'host': os.getenv('DB_HOST'),
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'database': os.getenv('DB_NAME')
+}
+# Value stored in race_summary/race_histogram for a dimension that is not broken down
+ALL='ALL'
+
+# SQLite version of MySQL's TIME_TO_SEC for 'HH:MM:SS' text
+def time_to_sec(value):
+    if value is None:
+        return None
+    seconds = 0
+    for part in str(value).split(':'):
+        seconds = seconds * 60 + int(float(part))
+    return seconds
+
+# Same equality MySQL applies to names with utf8mb4_0900_ai_ci (case and accent insensitive).
+# Cached because the SQLite collation compares the same names over and over
+@lru_cache(maxsize=1 << 17)
+def name_key(value):
+    value = unicodedata.normalize('NFKD', str(value or ''))
+    return ''.join(c for c in value if not unicodedata.combining(c)).casefold()
+
+class MySQLBackend:
+    name = 'mysql'
+
+    def __init__(self, config=DB_CONFIG):
+        # Only needed when this backend is used
+        import mysql.connector
+        self.connector = mysql.connector
+        self.Error = mysql.connector.Error
+        self.config = config
+        self.pool = None
+
+    def __str__(self):
+        return f"MySQL database '{self.config['database']}'"
+
+    # Connections come from a pool, created with the first one, and go back to it on close()
+    def connect(self):
+        if self.pool is None:
+            self.pool = MySQLPool(self.config)
+        return self.pool.get()
+
+    def cursor(self, conn):
+        return TimedCursor(conn.cursor())
+
+    def sql(self, query):
+        return query
+
+    def create_tables(self, cursor):
+        # 'runners' table
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS runners (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            gender ENUM('M', 'F'),
+            UNIQUE(name)
+        );
+        """)
+
+        # 'races' table
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS races (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            location VARCHAR(255) NOT NULL,
+            year INT NOT NULL,
+            distance VARCHAR(100),
+            participants INT,
+            UNIQUE(location, year)
+        );
+        """)
+
+        # 'results' table
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS race_results (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            runner_id INT NOT NULL,
+            race_id INT NOT NULL,
+            finish_time TIME,
+            age_group VARCHAR(35),
+            position INT,
+            percentile FLOAT,
+            UNIQUE KEY uq_runner_race (runner_id, race_id),
+            INDEX idx_race_id (race_id),
+            INDEX idx_finish_time (finish_time),
+            FOREIGN KEY (runner_id) REFERENCES runners(id) ON DELETE CASCADE,
+            FOREIGN KEY (race_id) REFERENCES races(id) ON DELETE CASCADE
+        );
+        """)
+
+        # 'import_manifest' table: one row per imported edition
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS import_manifest (
+            location VARCHAR(255) NOT NULL,
+            year INT NOT NULL,
+            row_count INT NOT NULL,
+            content_hash CHAR(64) NOT NULL,
+            imported_at DATETIME NOT NULL,
+            PRIMARY KEY (location, year)
+        );
+        """)
+
+        # Per-race aggregates by gender and age group ('ALL' when not broken down),
+        # rebuilt by the importer for every race it touches
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS race_summary (
+            race_id INT NOT NULL,
+            gender VARCHAR(3) NOT NULL,
+            age_group VARCHAR(35) NOT NULL,
+            participants INT NOT NULL,
+            best INT,
+            average FLOAT,
+            worst INT,
+            p10 INT,
+            p25 INT,
+            median INT,
+            p75 INT,
+            p90 INT,
+            PRIMARY KEY (race_id, gender, age_group),
+            FOREIGN KEY (race_id) REFERENCES races(id) ON DELETE CASCADE
+        );
+        """)
+
+        # 'race_histogram' table: finish time bins of each race_summary row
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS race_histogram (
+            race_id INT NOT NULL,
+            gender VARCHAR(3) NOT NULL,
+            age_group VARCHAR(35) NOT NULL,
+            bin_index INT NOT NULL,
+            bin_start FLOAT NOT NULL,
+            bin_end FLOAT NOT NULL,
+            finishers INT NOT NULL,
+            PRIMARY KEY (race_id, gender, age_group, bin_index),
+            FOREIGN KEY (race_id) REFERENCES races(id) ON DELETE CASCADE
+        );
+        """)
+
+    def index_names(self, cursor, table):
+        cursor.execute("""
+        SELECT DISTINCT index_name FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s
+        """, (table,))
+        return {row[0] for row in cursor.fetchall()}
+
+    def column_names(self, cursor, table):
+        cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s
+        """, (table,))
+        return {row[0] for row in cursor.fetchall()}
+
+    # Bulk loads of dumps insert children before their parents
+    def foreign_keys(self, cursor, enabled):
+        cursor.execute(f"SET FOREIGN_KEY_CHECKS = {int(enabled)}")
+
+    # Finish position (ties share it) and percentile of every result of a race,
+    # 'participants' must already be up to date in races
+    def rank_results(self, cursor, race_id):
+        cursor.execute("""
+        UPDATE race_results res
+        JOIN races ra ON ra.id = res.race_id
+        LEFT JOIN (
+            SELECT id, RANK() OVER (ORDER BY TIME_TO_SEC(finish_time)) AS position
+            FROM race_results
+            WHERE race_id = %s AND finish_time IS NOT NULL
+        ) ranked ON ranked.id = res.id
+        SET res.position = ranked.position,
+            res.percentile = 100.0 * (ra.participants - ranked.position) / ra.participants
+        WHERE res.race_id = %s
+        """, (race_id, race_id))
+
+# Translates the MySQL flavoured statements used across the project
+class SQLiteCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, query, params=()):
+        return self.cursor.execute(sql_for_sqlite(query), params)
+
+    def executemany(self, query, rows):
+        return self.cursor.executemany(sql_for_sqlite(query), rows)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+def sql_for_sqlite(query):
+    return query.replace('%s', '?').replace('INSERT IGNORE', 'INSERT OR IGNORE')
+
+# Embedded file-based backend with the same schema, no server needed
+class SQLiteBackend:
+    name = 'sqlite'
+    Error = sqlite3.Error
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+
+    def __str__(self):
+        return f"SQLite database '{self.path}'"
+
+    def connect(self):
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Parallel imports wait for each other's write lock instead of failing
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=60)
+        # Names and locations compare like the MySQL collation does
+        conn.create_collation('ai_ci', lambda a, b: (name_key(a) > name_key(b)) - (name_key(a) < name_key(b)))
+        conn.create_function('TIME_TO_SEC', 1, time_to_sec, deterministic=True)
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def cursor(self, conn):
+        return TimedCursor(SQLiteCursor(conn.cursor()))
+
+    def sql(self, query):
+        return sql_for_sqlite(query)
+
+    def create_tables(self, cursor):
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS runners (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(255) NOT NULL COLLATE ai_ci,
+            gender TEXT CHECK (gender IN ('M', 'F')),
+            UNIQUE(name)
+        );
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS races (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            location VARCHAR(255) NOT NULL COLLATE ai_ci,
+            year INT NOT NULL,
+            distance VARCHAR(100),
+            participants INT,
+            UNIQUE(location, year)
+        );
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS race_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            runner_id INT NOT NULL,
+            race_id INT NOT NULL,
+            finish_time TIME,
+            age_group VARCHAR(35),
+            position INT,
+            percentile FLOAT,
+            FOREIGN KEY (runner_id) REFERENCES runners(id) ON DELETE CASCADE,
+            FOREIGN KEY (race_id) REFERENCES races(id) ON DELETE CASCADE
+        );
+        """)
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_runner_race ON race_results (runner_id, race_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_race_id ON race_results (race_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_finish_time ON race_results (finish_time)")
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS import_manifest (
+            location VARCHAR(255) NOT NULL COLLATE ai_ci,
+            year INT NOT NULL,
+            row_count INT NOT NULL,
+            content_hash CHAR(64) NOT NULL,
+            imported_at DATETIME NOT NULL,
+            PRIMARY KEY (location, year)
+        );
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS race_summary (
+            race_id INT NOT NULL,
+            gender VARCHAR(3) NOT NULL,
+            age_group VARCHAR(35) NOT NULL,
+            participants INT NOT NULL,
+            best INT,
+            average FLOAT,
+            worst INT,
+            p10 INT,
+            p25 INT,
+            median INT,
+            p75 INT,
+            p90 INT,
+            PRIMARY KEY (race_id, gender, age_group),
+            FOREIGN KEY (race_id) REFERENCES races(id) ON DELETE CASCADE
+        );
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS race_histogram (
+            race_id INT NOT NULL,
+            gender VARCHAR(3) NOT NULL,
+            age_group VARCHAR(35) NOT NULL,
+            bin_index INT NOT NULL,
+            bin_start FLOAT NOT NULL,
+            bin_end FLOAT NOT NULL,
+            finishers INT NOT NULL,
+            PRIMARY KEY (race_id, gender, age_group, bin_index),
+            FOREIGN KEY (race_id) REFERENCES races(id) ON DELETE CASCADE
+        );
+        """)
+
+    def index_names(self, cursor, table):
+        cursor.execute(f"PRAGMA index_list({table})")
+        return {row[1] for row in cursor.fetchall()}
+
+    def column_names(self, cursor, table):
+        cursor.execute(f"PRAGMA table_info({table})")
+        return {row[1] for row in cursor.fetchall()}
+
+    # Only takes effect outside a transaction, commit first
+    def foreign_keys(self, cursor, enabled):
+        cursor.execute(f"PRAGMA foreign_keys = {'ON' if enabled else 'OFF'}")
+
+    def rank_results(self, cursor, race_id):
+        cursor.execute("""
+        UPDATE race_results
+        SET position = ranked.position,
+            percentile = 100.0 * (ranked.participants - ranked.position) / ranked.participants
+        FROM (
+            SELECT res.id, RANK() OVER (ORDER BY TIME_TO_SEC(res.finish_time)) AS position, ra.participants
+            FROM race_results res
+            JOIN races ra ON ra.id = res.race_id
+            WHERE res.race_id = ? AND res.finish_time IS NOT NULL
+        ) AS ranked
+        WHERE race_results.id = ranked.id
+        """, (race_id,))
+
+BACKENDS = {
+    'mysql': MySQLBackend,
+    'sqlite': SQLiteBackend
+}
+# One instance per backend and process, so everything shares the MySQL pool
+instances = {}
+
+# Backend selected with the DB_BACKEND environment variable ('mysql' or 'sqlite')
+def get_backend(name=None):
+    name = name or DB_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown DB_BACKEND '{name}', use one of: {', '.join(BACKENDS)}")
+    if name not in instances:
+        instances[name] = BACKENDS[name]()
+    return instances[name]
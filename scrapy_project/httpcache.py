@@ -0,0 +1,44 @@
+# Política de caché HTTP para el spider
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
+
+import time
+from datetime import datetime
+from scrapy.extensions.httpcache import RFC2616Policy, rfc1123_to_epoch
+
+
+# Las ediciones ya celebradas no cambian, así que sus páginas (resultados y perfiles) se sirven
+# siempre desde la caché. Solo las páginas de la edición en curso y el listado de ediciones
+# se revalidan: se dan por buenas durante HTTPCACHE_CURRENT_EDITION_TTL segundos y después
+# se vuelven a pedir con ETag/Last-Modified.
+class EdicionesCerradasPolicy(RFC2616Policy):
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.ttl = settings.getint('HTTPCACHE_CURRENT_EDITION_TTL')
+        self.edicion_actual = str(settings.get('HTTPCACHE_CURRENT_EDITION') or datetime.now().year)
+
+    def edicion_cerrada(self, request):
+        fecha = request.meta.get('fecha')
+        return bool(fecha) and fecha != self.edicion_actual
+
+    def should_cache_request(self, request):
+        return self.edicion_cerrada(request) or super().should_cache_request(request)
+
+    def should_cache_response(self, response, request):
+        if self.edicion_cerrada(request):
+            return response.status == 200
+        return super().should_cache_response(response, request)
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        if self.edicion_cerrada(request):
+            return True
+        fecha_respuesta = rfc1123_to_epoch(cachedresponse.headers.get(b'Date'))
+        if fecha_respuesta and time.time() - fecha_respuesta < self.ttl:
+            return True
+        return super().is_cached_response_fresh(cachedresponse, request)
+
+    def is_cached_response_valid(self, cachedresponse, response, request):
+        if self.edicion_cerrada(request):
+            return True
+        return super().is_cached_response_valid(cachedresponse, response, request)
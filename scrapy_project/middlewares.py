@@ -3,11 +3,28 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import os
+import sys
+import json
 from scrapy import signals
+from scrapy.downloadermiddlewares.retry import RetryMiddleware
+from scrapy.exceptions import DownloadTimeoutError
+from scrapy.utils.asyncio import sleep
+from scrapy.utils.response import response_status_message
+from twisted.internet import defer, error
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+# La espera entre reintentos es la misma que la de las conexiones a la base de datos (/database/)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database'))
+import metrics
+from connection import backoff_delay
+
+TIMEOUTS = (DownloadTimeoutError, error.TimeoutError, defer.TimeoutError, TimeoutError)
+# Callbacks de las páginas con resultados, las que se apuntan si se pierden
+PAGINAS_DE_RESULTADOS = ('parse_edicion', 'parse_resultados')
+
 
 class ProyectoSansilvestreSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -53,48 +70,167 @@ class ProyectoSansilvestreSpiderMiddleware:
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
-class ProyectoSansilvestreDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+# Sustituye a RetryMiddleware (mismos ajustes RETRY_*) y además:
+# - Ajusta la concurrencia de cada dominio con la latencia y la tasa de errores de las últimas
+#   ADAPTIVE_WINDOW respuestas: la reduce a la mitad si hay demasiados errores o la latencia media
+#   pasa de ADAPTIVE_TARGET_LATENCY, y la sube un 25% si la latencia está por debajo de la mitad.
+# - Espera antes de cada reintento (backoff exponencial con jitter) y, si fue un timeout, dobla el
+#   timeout de esa petición. Los reintentos de todo el crawl están limitados por un presupuesto.
+# - Apunta las páginas de resultados que no se pudieron recuperar en LOST_PAGES_FILE, para
+#   volver a pedir sus ediciones con -a reintentar=<fichero>.
+class ProyectoSansilvestreDownloaderMiddleware(RetryMiddleware):
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.adaptativo = settings.getbool('ADAPTIVE_CONCURRENCY_ENABLED')
+        self.concurrencia_minima = settings.getint('ADAPTIVE_CONCURRENCY_MIN')
+        self.concurrencia_maxima = settings.getint('ADAPTIVE_CONCURRENCY_MAX')
+        self.latencia_objetivo = settings.getfloat('ADAPTIVE_TARGET_LATENCY')
+        self.tasa_errores_maxima = settings.getfloat('ADAPTIVE_MAX_ERROR_RATE')
+        self.ventana = settings.getint('ADAPTIVE_WINDOW')
+        self.presupuesto_minimo = settings.getint('RETRY_BUDGET_MIN')
+        self.presupuesto_ratio = settings.getfloat('RETRY_BUDGET_RATIO')
+        self.espera_base = settings.getfloat('RETRY_BACKOFF_BASE')
+        self.espera_maxima = settings.getfloat('RETRY_BACKOFF_MAX')
+        self.timeout_maximo = settings.getfloat('RETRY_TIMEOUT_MAX')
+        self.fichero_perdidas = settings.get('LOST_PAGES_FILE')
+        # Por dominio: [respuestas, errores, suma de latencias] de la ventana actual
+        self.ventanas = {}
+        self.peticiones = 0
+        self.reintentos = 0
+        self.perdidas = []
+        # Ediciones de las que este crawl pidió páginas de resultados
+        self.ediciones_pedidas = set()
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
-        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        s = super().from_crawler(crawler)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
 
-    def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+    def process_request(self, request, spider=None):
+        self.peticiones += 1
+        if getattr(request.callback, '__name__', None) in PAGINAS_DE_RESULTADOS:
+            self.ediciones_pedidas.add(request.meta.get('fecha'))
+        metrics.inc('spider_requests', year=request.meta.get('fecha') or '-')
         return None
 
-    def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
-
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
-        return response
-
-    def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
-
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+    async def process_response(self, request, response, spider=None):
+        error_servidor = response.status in self.retry_http_codes
+        # Las respuestas de la caché no dicen nada del servidor
+        if 'cached' not in response.flags:
+            self.observar(request, error_servidor, request.meta.get('download_latency'))
+            if 'download_latency' in request.meta:
+                metrics.observe('spider_download', request.meta['download_latency'], year=request.meta.get('fecha') or '-')
+        if not error_servidor or request.meta.get('dont_retry', False):
+            return response
+        reintento = self.reintentar(request, response_status_message(response.status))
+        if reintento is None:
+            return response
+        await self.esperar(reintento)
+        return reintento
+
+    async def process_exception(self, request, exception, spider=None):
+        if not isinstance(exception, self.exceptions_to_retry) or request.meta.get('dont_retry', False):
+            return None
+        self.observar(request, True)
+        reintento = self.reintentar(request, exception)
+        if reintento is None:
+            return None
+        if isinstance(exception, TIMEOUTS):
+            timeout = request.meta.get('download_timeout') or self.crawler.settings.getfloat('DOWNLOAD_TIMEOUT')
+            reintento.meta['download_timeout'] = min(self.timeout_maximo, 2 * timeout)
+        await self.esperar(reintento)
+        return reintento
+
+    async def esperar(self, reintento):
+        await sleep(backoff_delay(reintento.meta['retry_times'], self.espera_base, self.espera_maxima))
+
+    # Reintento de la petición, o None si ya no quedan (se apunta como perdida)
+    def reintentar(self, request, motivo):
+        stats = self.crawler.stats
+        reintento = None
+        if self.reintentos < max(self.presupuesto_minimo, self.presupuesto_ratio * self.peticiones):
+            reintento = self._retry(request, motivo)
+        else:
+            stats.inc_value('reintentos/presupuesto_agotado')
+        if reintento is not None:
+            self.reintentos += 1
+            metrics.inc('spider_retries', year=request.meta.get('fecha') or '-')
+            return reintento
+
+        callback = getattr(request.callback, '__name__', None)
+        if callback in PAGINAS_DE_RESULTADOS:
+            self.perdidas.append({
+                'url': request.url,
+                'fecha': request.meta.get('fecha'),
+                'location': request.meta.get('location'),
+                'callback': callback,
+                'intentos': request.meta.get('retry_times', 0) + 1,
+                'motivo': str(motivo)
+            })
+            stats.inc_value('reintentos/paginas_perdidas')
+            stats.inc_value(f"ediciones/{request.meta.get('fecha')}/paginas_perdidas")
+            metrics.inc('spider_lost_pages', year=request.meta.get('fecha') or '-')
+        return None
 
-    def spider_opened(self, spider):
-        spider.logger.info("Spider opened: %s" % spider.name)
+    def observar(self, request, fallo, latencia=None):
+        if not self.adaptativo:
+            return
+        clave = request.meta.get('download_slot')
+        slot = self.crawler.engine.downloader.slots.get(clave)
+        if slot is None:
+            return
+        ventana = self.ventanas.setdefault(clave, [0, 0, 0.0])
+        ventana[0] += 1
+        if fallo:
+            ventana[1] += 1
+        elif latencia is not None:
+            ventana[2] += latencia
+        if ventana[0] < self.ventana:
+            return
+
+        respuestas, errores, suma = ventana
+        self.ventanas[clave] = [0, 0, 0.0]
+        latencia_media = suma / max(respuestas - errores, 1)
+        anterior = slot.concurrency
+        if errores / respuestas > self.tasa_errores_maxima or latencia_media > self.latencia_objetivo:
+            slot.concurrency = max(self.concurrencia_minima, anterior // 2)
+        elif latencia_media < self.latencia_objetivo / 2:
+            slot.concurrency = min(self.concurrencia_maxima, anterior + max(1, anterior // 4))
+        if slot.concurrency != anterior:
+            self.crawler.spider.logger.info(
+                f"Concurrencia de {clave}: {anterior} -> {slot.concurrency} "
+                f"(latencia media {latencia_media:.2f}s, {errores}/{respuestas} errores)")
+
+        stats = self.crawler.stats
+        stats.set_value(f"adaptativo/{clave}/concurrencia", slot.concurrency)
+        stats.min_value(f"adaptativo/{clave}/concurrencia_minima", slot.concurrency)
+        stats.max_value(f"adaptativo/{clave}/concurrencia_maxima", slot.concurrency)
+
+    # Del fichero de un crawl anterior solo se quitan las ediciones que este crawl volvió a pedir;
+    # las demás (fuera de -a years, saltadas por -a incremental...) siguen incompletas.
+    # Si no queda ninguna página perdida se borra el fichero
+    def spider_closed(self, spider):
+        if not self.fichero_perdidas:
+            return
+        anteriores = []
+        if os.path.exists(self.fichero_perdidas):
+            try:
+                with open(self.fichero_perdidas, encoding='utf-8') as f:
+                    anteriores = json.load(f)
+            except (OSError, ValueError) as e:
+                spider.logger.warning(f"No se pudo leer '{self.fichero_perdidas}': {e}")
+        anteriores = [pagina for pagina in anteriores if pagina.get('fecha') not in self.ediciones_pedidas]
+        perdidas = anteriores + self.perdidas
+        if not perdidas:
+            if os.path.exists(self.fichero_perdidas):
+                os.remove(self.fichero_perdidas)
+            return
+        carpeta = os.path.dirname(os.path.abspath(self.fichero_perdidas))
+        os.makedirs(carpeta, exist_ok=True)
+        with open(self.fichero_perdidas, 'w', encoding='utf-8') as f:
+            json.dump(perdidas, f, ensure_ascii=False, indent=2)
+        spider.logger.warning(
+            f"{len(perdidas)} páginas de resultados sin recuperar ({len(self.perdidas)} de este crawl), guardadas en "
+            f"'{self.fichero_perdidas}'. Se pueden volver a pedir sus ediciones con: "
+            f"scrapy crawl {spider.name} -a reintentar={self.fichero_perdidas}")
@@ -6,8 +6,20 @@
 
 # useful for handling different item types with a single interface
 
+import os
+import sys
 from itemadapter import ItemAdapter
-from scrapy.exceptions import DropItem
+from scrapy.exceptions import DropItem, NotConfigured
+from twisted.internet import defer, threads
+
+# La capa de almacenamiento y el importador están en /database/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database'))
+import metrics
+from storage import get_backend
+from snapshot import update_snapshot
+from connection import connect_with_retry
+from import_data import (BulkLoader, clear_edition, edition_race_ids, migrate_schema, race_key, save_manifest,
+                         track_edition, update_race_stats)
 
 class SanSilvestrePipeline:
     def process_item(self, item, spider):
@@ -21,6 +33,105 @@ class SanSilvestrePipeline:
 
         # VALIDACIÓN: Si no hay nombre o tiempo, descartamos la fila
         if not adapter.get('runner_name') or not adapter.get('finish_time'):
+            metrics.inc('spider_items_dropped', year=adapter.get('race_date') or '-')
             raise DropItem(f"Fila incompleta detectada: {item}")
 
+        metrics.inc('spider_items', year=adapter.get('race_date') or '-')
         return item
+
+
+# Escribe los items directamente en la base de datos, sin pasar por el fichero .json.
+# Los items se acumulan en lotes que se insertan en un hilo aparte para no bloquear el reactor.
+class DatabasePipeline:
+    def __init__(self, batch_size, stats=None):
+        self.batch_size = batch_size
+        self.stats = stats
+        self.buffer = []
+        self.editions = {}
+        self.new_editions = []
+        # Ediciones con algún lote que no se pudo guardar: no van al manifiesto (como las que
+        # perdieron páginas),
+        # así el siguiente import o rastreo incremental las vuelve a cargar
+        self.failed = set()
+        # Cadena de escrituras: cada lote espera a que termine el anterior
+        self.writing = defer.succeed(None)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('DB_PIPELINE_ENABLED'):
+            raise NotConfigured
+        return cls(crawler.settings.getint('DB_PIPELINE_BATCH_SIZE'), crawler.stats)
+
+    def open_spider(self, spider):
+        self.spider = spider
+        return threads.deferToThread(self.connect)
+
+    def connect(self):
+        self.backend = get_backend()
+        self.conn = connect_with_retry(self.backend)
+        self.cursor = self.backend.cursor(self.conn)
+        self.backend.create_tables(self.cursor)
+        migrate_schema(self.cursor, self.backend)
+        self.conn.commit()
+        self.loader = BulkLoader(self.cursor, self.batch_size)
+
+    def process_item(self, item, spider):
+        entry = ItemAdapter(item).asdict()
+        edition = track_edition(self.editions, entry)
+        # Primera fila de la edición: se reemplazan los resultados que ya hubiese
+        if edition['rows'] == 1:
+            self.new_editions.append(edition)
+
+        self.buffer.append(entry)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        return item
+
+    def flush(self):
+        items, self.buffer = self.buffer, []
+        editions, self.new_editions = self.new_editions, []
+        self.writing.addCallback(lambda _: threads.deferToThread(self.write, items, editions))
+        keys = {race_key(item['location'], item['race_date']) for item in items}
+        self.writing.addErrback(self.log_error, len(items), keys)
+
+    def write(self, items, editions):
+        try:
+            for edition in editions:
+                clear_edition(self.cursor, edition)
+            for item in items:
+                self.loader.add(item)
+            self.loader.flush()
+            self.conn.commit()
+        except Exception:
+            # Se deshace el lote entero, si no el commit del siguiente guardaría lo que llegó a escribir
+            self.conn.rollback()
+            # Los ids en memoria pueden ser de carreras o corredores que se acaban de deshacer
+            self.loader = BulkLoader(self.cursor, self.batch_size)
+            raise
+
+    def log_error(self, failure, count, keys):
+        self.failed.update(keys)
+        self.spider.logger.error(f"No se pudieron guardar {count} items en la base de datos: {failure.value}")
+
+    def close_spider(self, spider):
+        self.flush()
+        # Ediciones con páginas de resultados perdidas (las apunta el downloader middleware)
+        perdidas = {key for key, edition in self.editions.items()
+                    if self.stats and self.stats.get_value(f"ediciones/{edition['year']}/paginas_perdidas")}
+        self.writing.addCallback(lambda _: threads.deferToThread(self.close, perdidas))
+        return self.writing
+
+    def close(self, perdidas=()):
+        update_race_stats(self.cursor, self.backend, edition_race_ids(self.cursor, self.editions.values()))
+        incompletas = self.failed | set(perdidas)
+        save_manifest(self.cursor, [edition for key, edition in self.editions.items() if key not in incompletas])
+        self.conn.commit()
+        # Snapshot columnar para el dashboard
+        update_snapshot(self.cursor)
+        self.cursor.close()
+        self.conn.close()
+        self.spider.logger.info(f"{sum(e['rows'] for e in self.editions.values())} items guardados en {self.backend}")
+        for key in incompletas:
+            edition = self.editions[key]
+            self.spider.logger.error(f"{edition['location']} {edition['year']} quedó incompleta y no se guarda en el "
+                                     f"manifiesto: se volverá a importar")
@@ -22,19 +22,48 @@ LOG_LEVEL = "INFO"
 
 # Concurrency and throttling settings
 #CONCURRENT_REQUESTS = 16
-CONCURRENT_REQUESTS = 12
+CONCURRENT_REQUESTS = 32
 CONCURRENT_ITEMS = 25
-CONCURRENT_REQUESTS_PER_DOMAIN = 32
+# Starting concurrency per domain, ProyectoSansilvestreDownloaderMiddleware adjusts it
+CONCURRENT_REQUESTS_PER_DOMAIN = 8
 DOWNLOAD_DELAY = 0
 DOWNLOAD_TIMEOUT = 5
 
+# Adaptive concurrency: every ADAPTIVE_WINDOW responses of a domain, its concurrency is halved
+# if more than ADAPTIVE_MAX_ERROR_RATE of them failed or the mean latency went over
+# ADAPTIVE_TARGET_LATENCY seconds, and raised by 25% if it stayed under half of it
+ADAPTIVE_CONCURRENCY_ENABLED = True
+ADAPTIVE_CONCURRENCY_MIN = 2
+ADAPTIVE_CONCURRENCY_MAX = 32
+ADAPTIVE_TARGET_LATENCY = 2.0
+ADAPTIVE_MAX_ERROR_RATE = 0.1
+ADAPTIVE_WINDOW = 20
+
+# Retries (timeouts, connection errors and RETRY_HTTP_CODES), with exponential backoff and
+# jitter between attempts. A timed out request is retried with twice the timeout, up to
+# RETRY_TIMEOUT_MAX. The whole crawl retries at most max(RETRY_BUDGET_MIN, RETRY_BUDGET_RATIO
+# * requests) times, so a site that is down doesn't get hammered
+RETRY_TIMES = 3
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_MAX = 30
+RETRY_TIMEOUT_MAX = 30
+RETRY_BUDGET_MIN = 20
+RETRY_BUDGET_RATIO = 0.1
+# Result pages that were never recovered, re-crawl their editions with -a reintentar=<file>
+LOST_PAGES_FILE = 'data/paginas_perdidas.json'
+
 # Disable cookies (enabled by default)
 COOKIES_ENABLED = False
 
 ITEM_PIPELINES = {
     'scrapy_project.pipelines.SanSilvestrePipeline': 300,
+    'scrapy_project.pipelines.DatabasePipeline': 400,
 }
 
+# Write items straight to the database (DB_BACKEND in .env) instead of a feed file
+DB_PIPELINE_ENABLED = False
+DB_PIPELINE_BATCH_SIZE = 1000
+
 
 # Disable Telnet Console (enabled by default)
 #TELNETCONSOLE_ENABLED = False
@@ -55,9 +84,11 @@ FEED_EXPORT_ENCODING = 'utf-8'
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "proyecto_sansilvestre.middlewares.ProyectoSansilvestreDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    # Replaces RetryMiddleware, same position
+    "scrapy.downloadermiddlewares.retry.RetryMiddleware": None,
+    "scrapy_project.middlewares.ProyectoSansilvestreDownloaderMiddleware": 550,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -84,13 +115,19 @@ AUTOTHROTTLE_ENABLED = False
 # Enable showing throttling stats for every response received:
 #AUTOTHROTTLE_DEBUG = False
 
-# Enable and configure HTTP caching (disabled by default)
+# Enable and configure HTTP caching (disabled by default, enable with -s HTTPCACHE_ENABLED=1)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
-#HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = "httpcache"
-#HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# Past editions never change and are always served from the cache, only the current
+# edition is revalidated (ETag/Last-Modified) once HTTPCACHE_CURRENT_EDITION_TTL expires
+HTTPCACHE_ENABLED = False
+HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_DIR = "httpcache"
+HTTPCACHE_IGNORE_HTTP_CODES = [408, 429, 500, 502, 503, 504]
+HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+HTTPCACHE_POLICY = "scrapy_project.httpcache.EdicionesCerradasPolicy"
+HTTPCACHE_GZIP = True
+HTTPCACHE_CURRENT_EDITION = None  # Defaults to the current year
+HTTPCACHE_CURRENT_EDITION_TTL = 3600
 
 # Set settings whose default value is deprecated to a future-proof value
 FEED_EXPORT_ENCODING = "utf-8"
@@ -1,14 +1,94 @@
+import os
+import sys
+import json
+import time
+from datetime import datetime
+from urllib.parse import parse_qsl, urlparse
 import scrapy
+from lxml import etree
+from w3lib.url import add_or_replace_parameter
 from scrapy_project.items import RunnerItem
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'database'))
+import metrics
+from storage import get_backend
+from import_data import load_manifest, race_key
+
+# Filas de resultados ('table tbody tr'), compilado una sola vez
+FILAS_XPATH = etree.XPath('//table//tbody//tr')
+# Columnas que se leen de cada fila (clase de la celda -> campo)
+COLUMNAS = {
+    'nombre': 'nombre',
+    'apellidos': 'apellidos',
+    'tiempo_display': 'tiempo',
+    'get_puesto_categoria_display': 'categoria',
+    'get_puesto_sexo_display': 'sexo'
+}
+
 class SanSilvestreSpider(scrapy.Spider):
     name = "san_silvestre"
     start_urls = ["https://sansilvestrecoruna.com/es/web/resultado/"]
-    
-    # Caché para no entrar en los perfiles de todos los corredores
-    distancias_cache = {}
+    ediciones_excluidas = ["2020", "2013"]
+
+    #Argumentos del spider (scrapy crawl san_silvestre -a years=2024,2025 -a incremental=1):
+    # - years: solo se rastrean esas ediciones.
+    # - incremental: se saltan las ediciones que ya están completas en la base de datos (import_manifest).
+    #   La edición del año en curso se rastrea siempre, porque sus resultados aún pueden cambiar, y también
+    #   las que tienen páginas perdidas en LOST_PAGES_FILE aunque estén en el manifiesto.
+    # - reintentar: fichero de páginas perdidas (LOST_PAGES_FILE); solo se rastrean de nuevo sus ediciones, completas.
+    def __init__(self, years=None, incremental=None, reintentar=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.years = {year.strip() for year in years.split(',')} if years else None
+        # Caché para no entrar en los perfiles de todos los corredores
+        self.distancias_cache = {}
+        # Ediciones con un perfil ya pedido y los items que esperan a su distancia
+        self.perfiles_pedidos = set()
+        self.pendientes = {}
+        self.ediciones_completas = set()
+        # Páginas de resultados descargadas por edición: [inicio, última respuesta, número de páginas]
+        self.paginas_por_edicion = {}
+        if reintentar:
+            # Una edición con páginas perdidas quedó incompleta aunque esté en import_manifest
+            self.years = self.cargar_paginas_perdidas(reintentar)
+        elif incremental and incremental.lower() not in ('0', 'false', 'no'):
+            self.ediciones_completas = self.cargar_ediciones_completas()
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        fichero = crawler.settings.get('LOST_PAGES_FILE')
+        if spider.ediciones_completas and fichero and os.path.exists(fichero):
+            fechas = cls.leer_paginas_perdidas(fichero)
+            spider.ediciones_completas = {key for key in spider.ediciones_completas if key[1] not in fechas}
+            spider.logger.info(f"Modo incremental: se rastrean de nuevo las ediciones con páginas perdidas "
+                               f"en '{fichero}': {', '.join(sorted(fechas))}")
+        return spider
+
+    @staticmethod
+    def leer_paginas_perdidas(fichero):
+        with open(fichero, encoding='utf-8') as f:
+            return {pagina['fecha'] for pagina in json.load(f) if pagina.get('fecha')}
+
+    def cargar_paginas_perdidas(self, fichero):
+        fechas = self.leer_paginas_perdidas(fichero)
+        self.logger.info(f"Reintentando las ediciones con páginas perdidas: {', '.join(sorted(fechas))}")
+        return fechas
+
+    def cargar_ediciones_completas(self):
+        backend = get_backend()
+        try:
+            conn = backend.connect()
+            cursor = backend.cursor(conn)
+            completas = {key for key in load_manifest(cursor) if key[1] != str(datetime.now().year)}
+            conn.close()
+        except backend.Error as e:
+            self.logger.warning(f"No se pudo leer import_manifest, se rastrean todas las ediciones: {e}")
+            return set()
+        self.logger.info(f"Modo incremental: {len(completas)} ediciones ya están en la base de datos.")
+        return completas
 
-    #En el método parse, recorremos las ediciones de la carrera y filtramos las que no nos interesan (2020 y 2013). 
+    #En el método parse, recorremos las ediciones de la carrera y filtramos las que no nos interesan 
+    # (las excluidas, las que no están en 'years' y, en modo incremental, las que ya tenemos). 
     # Para cada edición válida, seguimos el enlace a su página de resultados.
     def parse(self, response):
         eventos = response.css('div.col-6.col-sm-4.col-md-3.mb-4')
@@ -17,11 +97,16 @@ class SanSilvestreSpider(scrapy.Spider):
             fecha = evento.css('p.year::text').get()
             fecha = fecha.strip() if fecha else ""
 
-            if fecha in ["2020", "2013"]:
+            if fecha in self.ediciones_excluidas:
                 self.logger.info(f"Saltando edición excluida: {fecha}")
                 continue
+            if self.years is not None and fecha not in self.years:
+                continue
             
             localizacion = evento.css('div.caption-content h3::text').get() or "A Coruña"
+            if race_key(localizacion, fecha) in self.ediciones_completas:
+                self.logger.info(f"Saltando edición ya importada: {fecha}")
+                continue
             enlace_edicion = evento.css('a.portfolio-link::attr(href)').get()
             
             if enlace_edicion:
@@ -35,6 +120,7 @@ class SanSilvestreSpider(scrapy.Spider):
     # Si no los encontramos, intentamos extraer los resultados directamente de la página de la edición.
 
     def parse_edicion(self, response):
+        self.paginas_por_edicion.setdefault(response.meta['fecha'], [time.time(), time.time(), 0])
         enlaces_absoluta = []
         for enlace in response.css('a'):
             texto = enlace.css('::text').get('').lower()
@@ -53,32 +139,60 @@ class SanSilvestreSpider(scrapy.Spider):
                 self.logger.warning(f"Año {response.meta['fecha']}: No se encontraron resultados.")
 
     #En la funcionde parse_resultados extraemos los datos de cada corredor y, si no tenemos la distancia de la carrera en caché, 
-    # seguimos el enlace al perfil del corredor para obtenerla. También manejamos la paginación de los resultados.
+    # pedimos un único perfil por edición para obtenerla. Mientras llega, los items de esa edición esperan en 'pendientes'.
+    # También manejamos la paginación de los resultados.
 
     def parse_resultados(self, response):
         fecha = response.meta.get('fecha')
-        filas = response.css('table tbody tr')
+        estadisticas = self.paginas_por_edicion.setdefault(fecha, [time.time(), time.time(), 0])
+        estadisticas[1] = time.time()
+        estadisticas[2] += 1
         
-        for fila in filas:
-            item = self.extraer_datos_tabla(fila, response.meta)
-            perfil_url = fila.css('td.nombre a::attr(href)').get()
-            
+        for item, perfil_url in self.extraer_tabla(response, response.meta):
             if fecha in self.distancias_cache:
                 item['race_distance'] = self.distancias_cache[fecha]
                 yield item
-            elif perfil_url:
+                continue
+
+            self.pendientes.setdefault(fecha, []).append(item)
+            if perfil_url and fecha not in self.perfiles_pedidos:
+                self.perfiles_pedidos.add(fecha)
                 yield response.follow(
                     perfil_url, 
                     callback=self.parse_perfil, 
-                    meta={'item': item},
+                    errback=self.perfil_fallido,
+                    meta={'fecha': fecha},
                     dont_filter=True 
                 )
-            else:
-                item['race_distance'] = None
-                yield item
 
-        
+        # Sin ningún perfil en camino no hay distancia que esperar
+        if fecha not in self.perfiles_pedidos:
+            yield from self.liberar_pendientes(fecha, None)
+
         siguiente = response.css('li.next a::attr(href), a[aria-label="Next"]::attr(href), a.next::attr(href)').get()
+
+        # Páginas intermedias pedidas en paralelo: de la siguiente ya se encarga otra petición
+        if response.meta.get('paginacion') == 'paralela':
+            return
+
+        # Primera página: si la paginación enseña la última, se piden todas a la vez en lugar de una a una
+        if siguiente and not response.meta.get('paginacion'):
+            paginas = self.paginas_visibles(response, siguiente)
+            if paginas:
+                parametro, ultima = paginas
+                self.logger.info(f"Año {fecha}: Pidiendo en paralelo las páginas 2 a {ultima}.")
+                for pagina in range(2, ultima + 1):
+                    yield scrapy.Request(
+                        add_or_replace_parameter(response.url, parametro, str(pagina)),
+                        callback=self.parse_resultados,
+                        meta={
+                            'fecha': fecha,
+                            'location': response.meta.get('location'),
+                            # La última página visible sigue en serie por si hubiese más
+                            'paginacion': 'serie' if pagina == ultima else 'paralela'
+                        }
+                    )
+                return
         
         if siguiente:
             self.logger.info(f"Año {fecha}: Pasando a la siguiente página...")
@@ -88,33 +202,99 @@ class SanSilvestreSpider(scrapy.Spider):
                 meta=response.meta,
                 dont_filter=True 
             )
+
+    #Busca en la paginación el parámetro de página (el que cambia en el enlace 'siguiente') y la página más alta enlazada.
+    # Devuelve None si no hay más de una página por delante, y entonces se sigue en serie.
+    def paginas_visibles(self, response, siguiente):
+        actuales = dict(parse_qsl(urlparse(response.url).query))
+        parametros = dict(parse_qsl(urlparse(response.urljoin(siguiente)).query))
+        parametro = next((nombre for nombre, valor in parametros.items()
+                          if valor.isdigit() and actuales.get(nombre) != valor), None)
+        if not parametro:
+            return None
+
+        ultima = 0
+        for enlace in response.css('ul.pagination a::attr(href), .pagination a::attr(href)').getall():
+            valor = dict(parse_qsl(urlparse(response.urljoin(enlace)).query)).get(parametro, '')
+            if valor.isdigit():
+                ultima = max(ultima, int(valor))
+        return (parametro, ultima) if ultima > 2 else None
+
+    #Al cerrar, deja en las estadísticas del crawl y en el fichero de métricas las páginas descargadas y las páginas
+    # por segundo de cada edición. Las peticiones, reintentos e items por edición ya los han contado el middleware y el pipeline.
+    def closed(self, reason):
+        stats = self.crawler.stats
+        for fecha, (inicio, fin, paginas) in sorted(self.paginas_por_edicion.items()):
+            por_segundo = paginas / max(fin - inicio, 1e-3)
+            stats.set_value(f"ediciones/{fecha}/paginas", paginas)
+            stats.set_value(f"ediciones/{fecha}/paginas_por_segundo", round(por_segundo, 2))
+            metrics.inc('spider_pages', paginas, year=fecha)
+            metrics.set_value('spider_pages_per_sec', round(por_segundo, 2), year=fecha)
+            self.logger.info(f"Año {fecha}: {paginas} páginas de resultados ({por_segundo:.2f} páginas/s).")
+        metrics.flush('spider')
+
     #La función extraer_datos_tabla se encarga de extraer los datos básicos de cada corredor desde la fila de la tabla,
     # incluyendo el nombre, tiempos, grupo de edad y género. También añade la fecha y ubicación de la carrera al item para su posterior uso en el perfil del corredor.
     def extraer_datos_tabla(self, fila, meta):
+        return self.crear_item(
+            fila.css('td.nombre a::text').get(''),
+            fila.css('td.apellidos a::text').get(''),
+            fila.css('td.tiempo_display::text').get(),
+            fila.css('td.get_puesto_categoria_display::text').get(),
+            fila.css('td.get_puesto_sexo_display::text').get(),
+            meta
+        )
+
+    def crear_item(self, nombre, apellidos, tiempo, raw_agegroup, raw_gender, meta):
         item = RunnerItem()
-        nombre = fila.css('td.nombre a::text').get('')
-        apellidos = fila.css('td.apellidos a::text').get('')
         item['runner_name'] = f"{nombre} {apellidos}".strip()
         
-        item['finish_time'] = fila.css('td.tiempo_display::text').get()
+        item['finish_time'] = tiempo
 
-        raw_agegroup = fila.css('td.get_puesto_categoria_display::text').get()
         item['age_group'] = raw_agegroup.split("-")[0].strip() if raw_agegroup and "-" in raw_agegroup else None
 
-        raw_gender = fila.css('td.get_puesto_sexo_display::text').get()
         item['gender'] = raw_gender.split("-")[0].strip() if raw_gender and "-" in raw_gender else None
 
         item['race_date'] = meta.get('fecha')
         item['location'] = meta.get('location')
         return item
 
+    #Versión rápida de extraer_datos_tabla para la tabla entera: recorre las celdas de cada fila una sola vez con lxml
+    # en lugar de lanzar seis selectores CSS por fila. Devuelve los mismos items junto al enlace al perfil del corredor.
+    def extraer_tabla(self, response, meta):
+        for fila in FILAS_XPATH(response.selector.root):
+            valores = {}
+            for celda in fila.iter('td'):
+                for clase in celda.get('class', '').split():
+                    campo = COLUMNAS.get(clase)
+                    if campo is None or campo in valores:
+                        continue
+                    if campo in ('nombre', 'apellidos'):
+                        enlace = next(celda.iter('a'), None)
+                        if enlace is None:
+                            continue
+                        valores[campo] = texto(enlace)
+                        if campo == 'nombre':
+                            valores['perfil'] = enlace.get('href')
+                    else:
+                        valores[campo] = texto(celda)
+
+            item = self.crear_item(
+                valores.get('nombre') or '',
+                valores.get('apellidos') or '',
+                valores.get('tiempo'),
+                valores.get('categoria'),
+                valores.get('sexo'),
+                meta
+            )
+            yield item, valores.get('perfil')
+
      #La función parse_perfil se encarga de extraer la distancia de la carrera desde el perfil del corredor. 
      # Primero intenta encontrar la distancia en la tabla de resultados, y si no la encuentra, busca cualquier texto que contenga " m" para obtener la distancia. 
-     # Luego, almacena esta información en caché para evitar futuras solicitudes al perfil de otros corredores de la misma edición.
+     # Luego, almacena esta información en caché y suelta los items de la edición que estaban esperando.
     
     def parse_perfil(self, response):
-        item = response.meta['item']
-        fecha = item['race_date']
+        fecha = response.meta['fecha']
         
         distancia = response.xpath('//tr[td[contains(text(), "META")]]/td[last()]/text()').get()
         if not distancia:
@@ -128,6 +308,25 @@ class SanSilvestreSpider(scrapy.Spider):
                 distancia = None
         
         self.distancias_cache[fecha] = distancia
-        item['race_distance'] = self.distancias_cache[fecha]
-        
-        yield item
\ No newline at end of file
+        yield from self.liberar_pendientes(fecha, distancia)
+
+    #Si el perfil no se pudo descargar, los items pendientes salen sin distancia y la siguiente página vuelve a intentarlo.
+    def perfil_fallido(self, failure):
+        fecha = failure.request.meta['fecha']
+        self.logger.warning(f"Año {fecha}: No se pudo obtener la distancia ({failure.value}).")
+        self.perfiles_pedidos.discard(fecha)
+        yield from self.liberar_pendientes(fecha, None)
+
+    def liberar_pendientes(self, fecha, distancia):
+        for item in self.pendientes.pop(fecha, []):
+            item['race_distance'] = distancia
+            yield item
+
+# Primer nodo de texto hijo del elemento, como '::text' con .get()
+def texto(elemento):
+    if elemento.text is not None:
+        return elemento.text
+    for hijo in elemento:
+        if hijo.tail is not None:
+            return hijo.tail
+    return None